@@ -0,0 +1,359 @@
+'''
+Offline benchmark suite for the ingestion paths of cl2pd.importData.
+
+It generates synthetic data at realistic scales (fake CALS responses, CALS CSV exports,
+Massi tarballs, MADX twiss files and matlab files), it measures the wall time, the throughput
+and the peak memory (tracemalloc) of each entry point and it compares the results with a stored baseline.
+
+No connection to CALS is needed: the pytimber LoggingDB is replaced by a synthetic backend
+before importing cl2pd.importData.
+
+===Example===
+# store a baseline
+python benchmarks/importDataBenchmark.py --scale small --save-baseline baseline.json
+# compare the current tree against the baseline (exit code 1 in case of regression, 2 if a benchmark fails)
+python benchmarks/importDataBenchmark.py --scale small --baseline baseline.json --tolerance 0.2
+'''
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+# Scales of the synthetic data. 'large' gives multi-GB CSV files and LHC-size twiss files.
+SCALES={
+    'small': {'calsVariables': 20, 'calsVectorVariables': 2, 'calsSamples': 10000, 'calsVectorLength': 3564,
+              'calsVectorSamples': 100, 'calsSplit': 4,
+              'csvVariables': 10, 'csvArrayVariables': 1, 'csvSamples': 10000, 'csvArrayLength': 500,
+              'massiBunches': 200, 'massiSamples': 100,
+              'twissElements': 2000,
+              'matFiles': 50},
+    'medium': {'calsVariables': 50, 'calsVectorVariables': 4, 'calsSamples': 100000, 'calsVectorLength': 3564,
+               'calsVectorSamples': 1000, 'calsSplit': 10,
+               'csvVariables': 20, 'csvArrayVariables': 2, 'csvSamples': 100000, 'csvArrayLength': 3564,
+               'massiBunches': 2500, 'massiSamples': 500,
+               'twissElements': 13000,
+               'matFiles': 500},
+    'large': {'calsVariables': 100, 'calsVectorVariables': 8, 'calsSamples': 1000000, 'calsVectorLength': 3564,
+              'calsVectorSamples': 10000, 'calsSplit': 24,
+              'csvVariables': 50, 'csvArrayVariables': 4, 'csvSamples': 1000000, 'csvArrayLength': 3564,
+              'massiBunches': 2800, 'massiSamples': 2000,
+              'twissElements': 30000,
+              'matFiles': 2000},
+}
+
+# The origin of the synthetic time series
+T0_s=1.5e9
+
+
+class FakeLoggingDB:
+    '''
+    Synthetic replacement of pytimber.LoggingDB.
+
+    The responses are generated once at creation, so that only the cl2pd elaboration is measured.
+    The vector variables have the same number of elements at each sample (as the bunch-by-bunch variables).
+    '''
+
+    def __init__(self, nVariables=10, nSamples=1000, nVectorVariables=0, vectorLength=3564, nVectorSamples=100,
+                 duration_s=3600.):
+        self.duration_s=duration_s
+        self.data={}
+        for i in range(nVariables):
+            name='BENCH.SCALAR.' + str(i) + ':VALUE'
+            self.data[name]=(np.sort(T0_s+np.random.uniform(0, duration_s, nSamples)),
+                             np.random.randn(nSamples))
+        for i in range(nVectorVariables):
+            name='BENCH.VECTOR.' + str(i) + ':BUNCH_INTENSITY'
+            self.data[name]=(np.linspace(T0_s, T0_s+duration_s, nVectorSamples),
+                             np.random.rand(nVectorSamples, vectorLength))
+
+    def search(self, pattern):
+        import fnmatch
+        return sorted([i for i in self.data if fnmatch.fnmatch(i, pattern.replace('%', '*'))])
+
+    def get(self, listOfVariables, t1, t2, fundamental=None):
+        if isinstance(listOfVariables, str):
+            listOfVariables=[listOfVariables]
+        t1=_toUnix(t1)
+        t2=_toUnix(t2)
+        out={}
+        for i in listOfVariables:
+            timestamps, values=self.data[i]
+            first=np.searchsorted(timestamps, t1, side='left')
+            last=np.searchsorted(timestamps, t2, side='right')
+            out[i]=(timestamps[first:last], values[first:last])
+        return out
+
+
+def _toUnix(t):
+    import pandas as pd
+    return pd.Timestamp(t).value/1e9
+
+
+def _importOffline():
+    '''
+    Import cl2pd.importData with the synthetic backend in place of pytimber.
+    '''
+    if 'cl2pd.importData' not in sys.modules:
+        fakePytimber=types.ModuleType('pytimber')
+        fakePytimber.LoggingDB=FakeLoggingDB
+        realPytimber=sys.modules.get('pytimber')
+        sys.modules['pytimber']=fakePytimber
+        try:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+            from cl2pd import importData
+        finally:
+            if realPytimber is None:
+                del sys.modules['pytimber']
+            else:
+                sys.modules['pytimber']=realPytimber
+    return sys.modules['cl2pd.importData']
+
+
+def writeCalsCSV(myFile, nVariables, nSamples, nArrayVariables=0, arrayLength=100):
+    '''
+    Write a synthetic CALS CSV export (the format of /eos/project/l/lhc-lumimod/) and return its size in bytes.
+    '''
+    import pandas as pd
+    times=pd.date_range(pd.Timestamp(T0_s, unit='s'), periods=nSamples, freq='1s')
+    timeStrings=times.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+    with open(myFile, 'w') as f:
+        for i in range(nVariables):
+            f.write('VARIABLE: BENCH.SCALAR.' + str(i) + ':VALUE\n\n')
+            f.write('Timestamp (UTC_TIME),Value\n')
+            values=np.random.randn(nSamples)
+            f.write('\n'.join([j + ',' + '%.17g' % k for j, k in zip(timeStrings, values)]) + '\n')
+        for i in range(nArrayVariables):
+            f.write('VARIABLE: BENCH.VECTOR.' + str(i) + ':BUNCH_INTENSITY\n\n')
+            f.write('Timestamp (UTC_TIME),Array Values\n')
+            # one sample every 10 seconds for the vector variables
+            for j in timeStrings[::10]:
+                f.write(j + ',' + ','.join(['%.6e' % k for k in np.random.rand(arrayLength)]) + '\n')
+    return os.path.getsize(myFile)
+
+
+def writeMassiTarball(myFile, fillNumber=6195, nBunches=100, nSamples=100, experiments=['ATLAS', 'CMS']):
+    '''
+    Write a synthetic Massi tarball (one lumi file per bunch and experiment) and return its size in bytes.
+    '''
+    folder=os.path.join(os.path.dirname(myFile), str(fillNumber))
+    os.makedirs(folder, exist_ok=True)
+    times=T0_s+60.*np.arange(nSamples)
+    for experiment in experiments:
+        for bunch in range(1, nBunches+1):
+            data=np.column_stack([times, np.ones(nSamples), np.random.rand(nSamples, 4)])
+            np.savetxt(os.path.join(folder, str(fillNumber) + '_lumi_' + str(10*bunch) + '_' + experiment + '.txt'),
+                       data, fmt=['%.0f', '%d', '%.6e', '%.6e', '%.6e', '%.6e'], header='time flag l el sl esl', comments='')
+    with tarfile.open(myFile, 'w:gz') as tar:
+        tar.add(folder, arcname=str(fillNumber))
+    shutil.rmtree(folder)
+    return os.path.getsize(myFile)
+
+
+def writeTwiss(myFile, nElements=13000):
+    '''
+    Write a synthetic MADX twiss file and return its size in bytes.
+    '''
+    columns=['S', 'L', 'BETX', 'BETY', 'ALFX', 'ALFY', 'MUX', 'MUY', 'DX', 'DY', 'DPX', 'DPY',
+             'X', 'Y', 'PX', 'PY', 'K0L', 'K1L', 'K2L', 'K3L']
+    with open(myFile, 'w') as f:
+        f.write('@ NAME             %05s "TWISS"\n')
+        f.write('@ SEQUENCE         %06s "LHCB1"\n')
+        f.write('@ ENERGY           %le          6500\n')
+        f.write('@ Q1               %le          62.31\n')
+        f.write('@ Q2               %le          60.32\n')
+        f.write('* NAME KEYWORD ' + ' '.join(columns) + '\n')
+        f.write('$ %s %s ' + ' '.join(['%le']*len(columns)) + '\n')
+        values=np.random.rand(nElements, len(columns))
+        values[:, 0]=np.cumsum(values[:, 1])
+        for i in range(nElements):
+            f.write(' "MB.' + str(i) + '.B1" "SBEND" ' + ' '.join(['%.12e' % j for j in values[i]]) + '\n')
+    return os.path.getsize(myFile)
+
+
+def writeMatFiles(folder, nFiles=100, nLosses=500):
+    '''
+    Write synthetic matlab files with the myDataStruct structure and return their total size in bytes.
+    '''
+    import scipy.io
+    os.makedirs(folder, exist_ok=True)
+    filesList=[]
+    for i in range(nFiles):
+        myFile=os.path.join(folder, str(i) + '.mat')
+        myDataStruct={'headerCycleStamps': np.array([T0_s*1e9+i*1.2e9]),
+                      'CPS_BLM': {'Acquisition': {'value': {'lastLosses': np.random.rand(nLosses)}}}}
+        scipy.io.savemat(myFile, {'myDataStruct': myDataStruct})
+        filesList.append(myFile)
+    return filesList, sum([os.path.getsize(i) for i in filesList])
+
+
+def measure(myFunction, repeat=3):
+    '''
+    Return the best wall time (in seconds) over repeat calls and the peak memory (in MB) of a further call.
+    '''
+    elapsed=[]
+    for i in range(repeat):
+        gc.collect()
+        start=time.perf_counter()
+        myFunction()
+        elapsed.append(time.perf_counter()-start)
+    gc.collect()
+    tracemalloc.start()
+    myFunction()
+    peak=tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(elapsed), peak/1024./1024.
+
+
+def _makeWorkDir(parent):
+    '''
+    Create and return a new subfolder of parent without '_' in its name.
+    '''
+    while True:
+        folder=tempfile.mkdtemp(prefix='cl2pdbenchmark', dir=parent)
+        if '_' not in os.path.basename(folder):
+            return folder
+        os.rmdir(folder)
+
+
+def runBenchmarks(scale='small', workDir=None, repeat=3, only=None, verbose=True):
+    '''
+    Run the benchmark suite and return a dictionary {benchmarkName: results}.
+
+    Each result contains the wall time (seconds), the throughput (with its unit) and the peak memory (peakMemory_MB).
+    The synthetic files are written in a new subfolder of workDir (by default the temporary folder),
+    removed at the end: workDir should not contain '_' (Massi file naming convention).
+    '''
+    import pandas as pd
+    importData=_importOffline()
+    myScale=SCALES[scale]
+    if workDir is None:
+        workDir=tempfile.gettempdir()
+    os.makedirs(workDir, exist_ok=True)
+    workDir=_makeWorkDir(workDir)
+    np.random.seed(0)
+
+    benchmarks=[]
+
+    # CALS extraction (synthetic backend)
+    def setupCals():
+        importData.cals=FakeLoggingDB(myScale['calsVariables'], myScale['calsSamples'],
+                                      myScale['calsVectorVariables'], myScale['calsVectorLength'],
+                                      myScale['calsVectorSamples'])
+        return myScale['calsVariables']*myScale['calsSamples']+myScale['calsVectorVariables']*myScale['calsVectorSamples']
+    t1=pd.Timestamp(T0_s, unit='s', tz='UTC')
+    t2=t1+pd.Timedelta(hours=1)
+    benchmarks.append(('cals2pd', setupCals, 'samples/s',
+                       lambda: importData.cals2pd(['BENCH.%'], t1, t2)))
+    benchmarks.append(('cals2pd_split', setupCals, 'samples/s',
+                       lambda: importData.cals2pd(['BENCH.%'], t1, t2, split=myScale['calsSplit'])))
+
+    # File importers
+    csvFile=os.path.join(workDir, 'cals.csv')
+    benchmarks.append(('calsCSV2pd',
+                       lambda: writeCalsCSV(csvFile, myScale['csvVariables'], myScale['csvSamples'],
+                                            myScale['csvArrayVariables'], myScale['csvArrayLength'])/1024./1024.,
+                       'MB/s', lambda: importData.calsCSV2pd(csvFile)))
+    massiFile=os.path.join(workDir, '6195.tgz')
+    massiUnzipPath=os.path.join(workDir, 'massi')
+    os.makedirs(massiUnzipPath, exist_ok=True)
+    benchmarks.append(('massiFile2pd',
+                       lambda: writeMassiTarball(massiFile, 6195, myScale['massiBunches'], myScale['massiSamples'])/1024./1024.,
+                       'MB/s', lambda: importData.massiFile2pd(massiFile, myUnzipPath=massiUnzipPath)))
+    twissFile=os.path.join(workDir, 'lhcb1.twiss')
+    benchmarks.append(('tfs2pd', lambda: writeTwiss(twissFile, myScale['twissElements'])/1024./1024.,
+                       'MB/s', lambda: importData.tfs2pd(twissFile)))
+    matFolder=os.path.join(workDir, 'mat')
+    matFiles=[]
+    def setupMat():
+        aux=writeMatFiles(matFolder, myScale['matFiles'])
+        matFiles[:]=aux[0]
+        return len(matFiles)
+    benchmarks.append(('mat2pd', setupMat, 'files/s',
+                       lambda: importData.mat2pd(['CPS_BLM.Acquisition.value.lastLosses'], matFiles)))
+
+    results={}
+    for name, setup, unit, myFunction in benchmarks:
+        if only is not None and name not in only:
+            continue
+        if verbose: print('Benchmarking ' + name + '...')
+        try:
+            size=setup()
+            elapsed, peak=measure(myFunction, repeat)
+            results[name]={'seconds': elapsed, 'throughput': size/elapsed, 'unit': unit, 'peakMemory_MB': peak}
+        except Exception as e:
+            print('Error in ' + name + ': ' + repr(e))
+            results[name]={'error': repr(e)}
+    shutil.rmtree(workDir, ignore_errors=True)
+    return results
+
+
+def compareWithBaseline(results, baseline, tolerance=0.2):
+    '''
+    Return a pandas DataFrame comparing results with baseline and a flag True if there is a regression.
+
+    A regression is a time or a peak memory larger than (1+tolerance) times the baseline one.
+    '''
+    import pandas as pd
+    rows=[]
+    regression=False
+    for name in sorted(results):
+        if 'error' in results[name] or name not in baseline or 'error' in baseline[name]:
+            continue
+        timeRatio=results[name]['seconds']/baseline[name]['seconds']
+        memoryRatio=results[name]['peakMemory_MB']/max(baseline[name]['peakMemory_MB'], 1e-6)
+        isRegression=(timeRatio>1+tolerance) or (memoryRatio>1+tolerance)
+        regression=regression or isRegression
+        rows.append([name, baseline[name]['seconds'], results[name]['seconds'], timeRatio,
+                     baseline[name]['peakMemory_MB'], results[name]['peakMemory_MB'], memoryRatio, isRegression])
+    return pd.DataFrame(rows, columns=['benchmark', 'baseline [s]', 'current [s]', 'time ratio',
+                                       'baseline [MB]', 'current [MB]', 'memory ratio', 'regression']).set_index('benchmark'), regression
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Offline benchmarks of the cl2pd.importData ingestion paths.')
+    parser.add_argument('--scale', default='small', choices=sorted(SCALES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', default=None, help='names of the benchmarks to run')
+    parser.add_argument('--workdir', default=None, help='folder where a temporary subfolder for the synthetic files is created (without "_")')
+    parser.add_argument('--baseline', default=None, help='JSON file with the baseline to compare with')
+    parser.add_argument('--save-baseline', default=None, help='JSON file where to store the results')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args=parser.parse_args(argv)
+
+    results=runBenchmarks(args.scale, args.workdir, args.repeat, args.only)
+    error=False
+    for name in sorted(results):
+        if 'error' in results[name]:
+            error=True
+            print('%-16s ERROR %s' % (name, results[name]['error']))
+        else:
+            print('%-16s %10.3f s %14.1f %-10s %10.1f MB' % (name, results[name]['seconds'], results[name]['throughput'],
+                                                        results[name]['unit'], results[name]['peakMemory_MB']))
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'scale': args.scale, 'results': results}, f, indent=2, sort_keys=True)
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline=json.load(f)
+        if baseline['scale']!=args.scale:
+            print('Warning: the baseline was stored with scale ' + baseline['scale'] + '.')
+        comparison, regression=compareWithBaseline(results, baseline['results'], args.tolerance)
+        print(comparison.to_string())
+        if regression:
+            return 1
+    if error:
+        return 2
+    return 0
+
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+'''
+Vectorized analysis of the vector variables (bunch-by-bunch, spectra) extracted with importData.
+
+The vector samples of a variable are stacked once in a 2-D array (time x element),
+so that the analysis is done with whole-array operations instead of per-sample or per-bunch loops.
+'''
+import pandas as pd
+import numpy as np
+
+
+def fillingPattern(series, threshold=0.):
+    '''
+    Return the slots with a value larger than threshold in the first valid sample of series.
+
+    ===Example===
+    RAW_DATA = importData.cals2pd(['LHC.BCTFR.A6R4.B%:BUNCH_INTENSITY'], t1, t2)
+    slotsB1 = analysisFunctions.fillingPattern(RAW_DATA['LHC.BCTFR.A6R4.B1:BUNCH_INTENSITY'])
+    '''
+    aux=series.dropna()
+    if len(aux)==0:
+        return np.array([], dtype=int)
+    return np.where(np.asarray(aux.iloc[0])>threshold)[0]
+
+
+def vector2pd(series, slots=None):
+    '''
+    Return a pandas dataframe (time x slot) from a vector-valued series (one array per timestamp).
+
+    The samples are stacked in a single 2-D array (all the samples must have the same length).
+    If slots is specified (e.g. from fillingPattern) only those columns are kept.
+
+    ===Example===
+    slotsB1 = analysisFunctions.fillingPattern(RAW_DATA['LHC.BCTFR.A6R4.B1:BUNCH_INTENSITY'])
+    FBCT_B1 = analysisFunctions.vector2pd(RAW_DATA['LHC.BCTFR.A6R4.B1:BUNCH_INTENSITY'], slotsB1)
+    LUMI_ATLAS = analysisFunctions.vector2pd(RAW_DATA['ATLAS:BUNCH_LUMI_INST'], slotsB1)
+    # the per-bunch operations are whole-array operations, e.g.
+    dI_dt = analysisFunctions.bunchRate(FBCT_B1, '90s')
+    '''
+    aux=series.dropna()
+    if len(aux)==0:
+        return pd.DataFrame()
+    matrix=np.vstack(aux.values)
+    if slots is None:
+        slots=np.arange(matrix.shape[1])
+    else:
+        slots=np.asarray(slots)
+        matrix=matrix[:, slots]
+    myDF=pd.DataFrame(matrix, index=aux.index, columns=slots)
+    myDF.columns.name='slot'
+    return myDF
+
+
+def bunchRate(myDF, window='90s'):
+    '''
+    Return the time derivative (per second) of each column of myDF averaged in bins of window.
+
+    ===Example===
+    # effective cross-section of the B1 bunches (the units depend on the luminosity ones)
+    dI_dt = analysisFunctions.bunchRate(FBCT_B1, '90s')
+    lumi = (LUMI_ATLAS+LUMI_CMS).resample('90s').mean()
+    sigma = -dI_dt/lumi
+    '''
+    aux=myDF.resample(window).mean()
+    dt=aux.index.to_series().diff().dt.total_seconds()
+    return aux.diff().div(dt, axis=0)
+
+
+def fft2tune(series, window=(600, 670), interpolation='parabolic', binToTune=.5/1024.):
+    '''
+    Return the tune series from a series of BBQ spectra (e.g. LHC.BQBBQ.CONTINUOUS.B1:FFT_DATA_H).
+
+    The spectra are stacked once and the peak is searched in the bins [window[0], window[1]) of all the spectra
+    in a single vectorized pass. The peak position can be refined with a 'parabolic' or 'gaussian'
+    three-point interpolation (interpolation=None to keep the bin of the maximum).
+    The peak bin is converted in tune multiplying by binToTune.
+
+    ===Example===
+    RAW_DATA = importData.cals2pd(['LHC.BQBBQ.CONTINUOUS.B%:FFT_DATA_%'], t1, t2)
+    QH_B1 = analysisFunctions.fft2tune(RAW_DATA['LHC.BQBBQ.CONTINUOUS.B1:FFT_DATA_H'])
+    '''
+    aux=series.dropna()
+    if len(aux)==0:
+        return pd.Series(dtype=float, name=series.name)
+    spectra=np.vstack(aux.values)[:, window[0]:window[1]].astype(float)
+    peak=np.argmax(spectra, axis=1)
+    delta=np.zeros(len(peak))
+
+    if interpolation is not None:
+        if interpolation not in ['parabolic', 'gaussian']:
+            raise ValueError("interpolation should be None, 'parabolic' or 'gaussian'.")
+        rows=np.arange(len(peak))
+        inner=(peak>0) & (peak<spectra.shape[1]-1)
+        center=np.clip(peak, 1, spectra.shape[1]-2)
+        left, middle, right=spectra[rows, center-1], spectra[rows, center], spectra[rows, center+1]
+        if interpolation=='gaussian':
+            # the gaussian interpolation is the parabolic one on the logarithm of the spectrum
+            inner=inner & (left>0) & (middle>0) & (right>0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                left, middle, right=np.log(left), np.log(middle), np.log(right)
+        denominator=left-2.*middle+right
+        inner=inner & (denominator!=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta=np.where(inner, .5*(left-right)/denominator, 0.)
+
+    return pd.Series((peak+window[0]+delta)*binToTune, index=aux.index, name=series.name)
+
+
+def tunes2pd(myDF, window=(600, 670), interpolation='parabolic', binToTune=.5/1024.):
+    '''
+    Return a tidy pandas dataframe (columns 'beam', 'plane' and 'tune') of the tunes computed
+    with fft2tune from all the BBQ spectra (columns '...B1:FFT_DATA_H', '...B2:FFT_DATA_V', ...) of myDF.
+
+    ===Example===
+    RAW_DATA = importData.cals2pd(['LHC.BQBBQ.CONTINUOUS.B%:FFT_DATA_%'], t1, t2)
+    TUNES = analysisFunctions.tunes2pd(RAW_DATA)
+    TUNES[(TUNES['beam']=='B1') & (TUNES['plane']=='H')]['tune'].plot()
+    '''
+    import re
+    myList=[]
+    for i in myDF.columns:
+        aux=re.search(r'(B[12]):FFT_DATA_([HV])$', str(i))
+        if aux is None:
+            continue
+        tune=fft2tune(myDF[i], window, interpolation, binToTune)
+        myList.append(pd.DataFrame({'beam': aux.group(1), 'plane': aux.group(2), 'tune': tune.values},
+                                   index=tune.index, columns=['beam', 'plane', 'tune']))
+    if len(myList)==0:
+        return pd.DataFrame(columns=['beam', 'plane', 'tune'])
+    return pd.concat(myList).sort_index(kind='mergesort')
@@ -0,0 +1,105 @@
+'''
+Parsing of the cals CSV files (the files of /eos/project/l/lhc-lumimod/).
+
+This module does not import pytimber (no JVM): it is the one imported by the worker processes
+of importData.calsCSVs2pd. The public functions are importData.calsCSV2pd and importData.calsCSVs2pd.
+'''
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import profiling
+
+
+def _calsCSVVariables(myFile):
+    '''
+    Return the list of the variables of a cals CSV file, one pd DataFrame (with a single column) per variable.
+
+    This function is supposed to be private.
+    '''
+    # I read the full file once to have the line numbers when a new variable starts, its name and its type
+    startLinesList = []
+    variableNameList = []
+    variableTypeList=[]
+    profiling.count('bytes', os.path.getsize(myFile))
+    with open(myFile, 'r') as file, profiling.stage('csv.scan'):
+        lines=file.readlines()
+        i=0
+        for i in range(len(lines)):
+            if lines[i][0:8]=='VARIABLE':
+                variableName=lines[i].split(': ')[1][0:-1]
+                startLinesList.append(i)
+                variableNameList.append(variableName)            
+
+            if lines[i][0:9]=='Timestamp':
+                variableName=lines[i].split(',')[1][0:-1]
+                variableTypeList.append(variableName)
+
+        startLinesList.append(i+1)
+
+    # in the second part I fill for each variable a pd DataFrame.
+    # for the moment I assume that only two variable type are used ('Value' and 'Array Values')
+    # TODO: relax the assumptions above.
+    dfList=[]
+    for i in range(len(startLinesList)-1):
+        with profiling.stage('csv.parse'):
+            if variableTypeList[i]=='Value':
+                # in this case I use the pd.read_csv
+                df=pd.read_csv(myFile,skiprows=startLinesList[i]+1, nrows=startLinesList[i+1]-3-startLinesList[i],)
+                df=df.set_index('Timestamp (UTC_TIME)')
+                df=df.rename(index=str, columns={'Value': variableNameList[i] })
+                df.index=pd.DatetimeIndex(df.index)
+            if variableTypeList[i]=='Array Values':
+                # in this case I use a custom solution
+                j=startLinesList[i]+3
+                myTime=[]
+                myArray=[]
+                while j<(startLinesList[i+1]):    
+                    myReading=lines[j].split(',')
+                    myTime.append(myReading[0])
+                    myArray.append(np.double(myReading[1:]))
+                    j=j+1
+                df=pd.DataFrame({'Array Values':myArray,'Timestamp (UTC_TIME)':myTime})
+                df=df.set_index('Timestamp (UTC_TIME)')
+                df=df.rename(index=str, columns={'Array Values': variableNameList[i] })     
+                df.index=pd.DatetimeIndex(df.index)
+        profiling.count('samples', len(df))
+        dfList.append(df)
+    return dfList
+
+
+def _calsCSV2ipc(arguments):
+    '''
+    Parse a cals CSV file and write each variable in an Arrow IPC file (columns 'time' and 'value') of outputFolder.
+
+    This function is supposed to be private: it is executed in the worker processes of calsCSVs2pd.
+    It returns the file name, the list of (variable, IPC file, kind) and the parsing time in seconds.
+    '''
+    import pyarrow as pa
+    myFile, outputFolder, fileIndex=arguments
+    start=time.perf_counter()
+    output=[]
+    for j, df in enumerate(_calsCSVVariables(myFile)):
+        name=df.columns[0]
+        times=pa.array(df.index.values.astype('datetime64[ns]').astype(np.int64))
+        values=df[name].values
+        if values.dtype==object:
+            kind='vector'
+            # the rows are written as the offsets and the flattened values of a list array
+            rows=[np.asarray(i, dtype=float).ravel() for i in values]
+            offsets=np.zeros(len(rows)+1, dtype=np.int32)
+            np.cumsum([len(i) for i in rows], out=offsets[1:])
+            flat=np.concatenate(rows) if len(rows) else np.array([], dtype=float)
+            values=pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat))
+        else:
+            kind='scalar'
+            values=pa.array(values)
+        table=pa.Table.from_arrays([times, values], names=['time', 'value'])
+        ipcFile=os.path.join(outputFolder, str(fileIndex) + '_' + str(j) + '.arrow')
+        with pa.OSFile(ipcFile, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        output.append((name, ipcFile, kind))
+    return myFile, output, time.perf_counter()-start
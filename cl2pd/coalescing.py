@@ -0,0 +1,268 @@
+'''
+Coalescing of the concurrent requests to the logging DB.
+
+When several threads (or notebooks sharing a service) ask for the same or overlapping
+(variables, interval) at the same moment, the requests are merged in a single backend call
+and the result is shared among the callers through futures.
+A request waiting for a free slot of the backend is widened (variables and interval) by a new overlapping
+request only if the widened request is not more expensive (variables x duration) than the two separate ones
+(e.g. same variables on overlapping intervals, or different variables on the same interval),
+a request already running is joined by the new requests that it covers.
+The number of concurrent backend calls is capped by a semaphore.
+
+The wrapper has the same interface of pytimber.LoggingDB (the methods not coalesced are forwarded),
+therefore all the importData functions can use it.
+
+===Example===
+from cl2pd import coalescing
+coalescing.install(maxConcurrent=4)    # importData.cals is wrapped
+raw_data = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2)
+
+# from asyncio
+DATA = await importData.cals.aget(['LHC.BCTDC.A6R4.B1:BEAM_INTENSITY'], t1, t2)
+'''
+import asyncio
+import datetime
+import functools
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from . import profiling
+
+
+def _toUnix(t):
+    '''
+    Return the unix time (s) of t.
+
+    As in pytimber.LoggingDB, the numbers are unix times and the tz-naive expressions (strings, datetimes)
+    are in the local time of the machine. The tz-aware expressions are converted.
+    '''
+    if isinstance(t, (int, float, np.integer, np.floating)):
+        return float(t)
+    t=pd.Timestamp(t)
+    if t.tz is None:
+        return time.mktime(t.to_pydatetime().timetuple())+t.microsecond/1e6+t.nanosecond/1e9
+    return t.value/1e9
+
+
+def _fromUnix(timestamps):
+    '''
+    Return the tz-naive local datetimes of the unix timestamps (as pytimber.LoggingDB.get with unixtime=False).
+    '''
+    return np.array([datetime.datetime.fromtimestamp(i) for i in timestamps], dtype=object)
+
+
+class _Request:
+    '''
+    A backend call shared by one or more callers.
+    '''
+
+    def __init__(self, variables, t1, t2, fundamental):
+        self.variables=set(variables)
+        self.t1=t1
+        self.t2=t2
+        self.fundamental=fundamental
+        self.started=False
+        self.future=Future()
+
+    def widenedCost(self, variables, t1, t2):
+        '''
+        Return the cost (variables x duration) of the request widened by (variables, t1, t2)
+        and the cost of the two separate requests.
+        '''
+        widened=len(self.variables.union(variables))*(max(self.t2, t2)-min(self.t1, t1))
+        return widened, len(self.variables)*(self.t2-self.t1)+len(set(variables))*(t2-t1)
+
+
+class CoalescingDB:
+    '''
+    Wrapper of a pytimber.LoggingDB coalescing the concurrent get and getLHCFillData calls.
+
+    db: the wrapped pytimber.LoggingDB
+    maxConcurrent: maximum number of concurrent backend calls
+    delay: time (s) a new request waits before being sent, so that the requests arriving
+    in the meantime can be merged with it
+    maxGap: two interval requests are merged if the gap between them is not larger than maxGap (s)
+    '''
+
+    def __init__(self, db, maxConcurrent=4, delay=0., maxGap=0.):
+        self.db=db
+        self.delay=delay
+        self.maxGap=maxGap
+        self._semaphore=threading.BoundedSemaphore(maxConcurrent)
+        self._lock=threading.Lock()
+        # interval requests (pending or running) and exact-key requests ('last', fills)
+        self._requests=[]
+        self._exact={}
+
+    def __getattr__(self, name):
+        # the methods not coalesced (e.g. search, getScaled) are forwarded to the wrapped DB
+        return getattr(self.db, name)
+
+    def _call(self, function, *args):
+        with self._semaphore:
+            return function(*args)
+
+    def _exactCall(self, key, function, *args):
+        '''
+        Run function(*args) once for all the concurrent callers with the same key.
+        '''
+        with self._lock:
+            future=self._exact.get(key)
+            leader=future is None
+            if leader:
+                future=Future()
+                self._exact[key]=future
+        if not leader:
+            profiling.count('coalesced')
+            return future.result()
+        try:
+            future.set_result(self._call(function, *args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._exact[key]
+        return future.result()
+
+    def get(self, variables, t1, t2=None, fundamental=None, unixtime=True):
+        '''
+        Same as pytimber.LoggingDB.get, the overlapping concurrent requests are merged.
+
+        The patterns (e.g. 'LHC.BCTDC.%') are resolved with search before the requests are compared.
+        '''
+        variables=self._resolve(variables)
+        if t2 is None or isinstance(t2, str):
+            # e.g. t2='last': only the identical requests are merged
+            key=('get', tuple(variables), _toUnix(t1), t2, fundamental, unixtime)
+            return self._exactCall(key, self._get, variables, t1, t2, fundamental, unixtime)
+
+        t1, t2=_toUnix(t1), _toUnix(t2)
+        with self._lock:
+            request=None
+            for i in self._requests:
+                if i.fundamental!=fundamental:
+                    continue
+                if i.started:
+                    # a running request can be joined only if it covers the new one
+                    if i.variables.issuperset(variables) and i.t1<=t1 and t2<=i.t2:
+                        request=i
+                        break
+                elif t1<=i.t2+self.maxGap and i.t1<=t2+self.maxGap:
+                    # a pending request is widened only if it does not increase the load of the backend
+                    widened, separate=i.widenedCost(variables, t1, t2)
+                    if widened>separate:
+                        continue
+                    i.variables.update(variables)
+                    i.t1, i.t2=min(i.t1, t1), max(i.t2, t2)
+                    request=i
+                    break
+            leader=request is None
+            if leader:
+                request=_Request(variables, t1, t2, fundamental)
+                self._requests.append(request)
+
+        if leader:
+            self._run(request)
+        else:
+            profiling.count('coalesced')
+        return self._slice(request.future.result(), variables, t1, t2, unixtime)
+
+    def _resolve(self, variables):
+        '''
+        Return the sorted list of the variable names (the patterns are resolved with search).
+        '''
+        if isinstance(variables, str):
+            variables=[variables]
+        names=set()
+        for i in variables:
+            if '%' in i:
+                names.update(self.db.search(i))
+            else:
+                names.add(i)
+        return sorted(names)
+
+    def _run(self, request):
+        try:
+            if self.delay>0:
+                time.sleep(self.delay)
+            with self._semaphore:
+                with self._lock:
+                    request.started=True
+                    variables=sorted(request.variables)
+                    t1, t2=request.t1, request.t2
+                # pyTimber needs CET as internal variable
+                DATA=self._get(variables, pd.Timestamp(t1, unit='s', tz='UTC').astimezone('CET'),
+                               pd.Timestamp(t2, unit='s', tz='UTC').astimezone('CET'), request.fundamental)
+            request.future.set_result(DATA)
+        except BaseException as e:
+            request.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._requests.remove(request)
+
+    def _get(self, variables, t1, t2, fundamental, unixtime=True):
+        kwargs={} if unixtime else {'unixtime': False}
+        if fundamental is None:
+            return self.db.get(variables, t1, t2, **kwargs)
+        return self.db.get(variables, t1, t2, fundamental, **kwargs)
+
+    @staticmethod
+    def _slice(DATA, variables, t1, t2, unixtime=True):
+        '''
+        Return the variables of DATA within [t1, t2].
+        '''
+        out={}
+        for i in variables:
+            if i not in DATA:
+                continue
+            timestamps, values=DATA[i]
+            timestamps=np.asarray(timestamps)
+            mask=(timestamps>=t1) & (timestamps<=t2)
+            timestamps=timestamps[mask]
+            out[i]=(timestamps if unixtime else _fromUnix(timestamps), np.asarray(values)[mask])
+        return out
+
+    def getLHCFillData(self, fillNumber, *args, **kwargs):
+        '''
+        Same as pytimber.LoggingDB.getLHCFillData, the concurrent requests of the same fill are merged.
+        '''
+        key=('getLHCFillData', fillNumber, args, tuple(sorted(kwargs.items())))
+        return self._exactCall(key, functools.partial(self.db.getLHCFillData, fillNumber, *args, **kwargs))
+
+    async def aget(self, variables, t1, t2=None, fundamental=None, unixtime=True):
+        '''
+        Coroutine version of get (executed in the default executor of the running loop).
+        '''
+        loop=asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.get, variables, t1, t2, fundamental, unixtime))
+
+    async def agetLHCFillData(self, fillNumber):
+        '''
+        Coroutine version of getLHCFillData (executed in the default executor of the running loop).
+        '''
+        loop=asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.getLHCFillData, fillNumber)
+
+
+def install(maxConcurrent=4, delay=0., maxGap=0.):
+    '''
+    Wrap importData.cals in a CoalescingDB (if not already wrapped) and return it.
+    '''
+    from . import importData
+    if not isinstance(importData.cals, CoalescingDB):
+        importData.cals=CoalescingDB(importData.cals, maxConcurrent, delay, maxGap)
+    return importData.cals
+
+
+def uninstall():
+    '''
+    Restore the pytimber.LoggingDB wrapped by install.
+    '''
+    from . import importData
+    if isinstance(importData.cals, CoalescingDB):
+        importData.cals=importData.cals.db
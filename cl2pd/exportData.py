@@ -0,0 +1,396 @@
+'''
+Export of the importData outputs in a partitioned columnar dataset (Parquet) and lazy query of the dataset.
+
+The outputs of cals2pd and calsCSV2pd (one column per variable, unique UTC index) are stored one folder per variable
+and one Parquet file per partition (day or fill) with the columns 'time' and 'value'.
+The vector variables are stored as fixed-size list columns (list columns if the length changes).
+The outputs with repeated timestamps (e.g. massiFile2pd) are stored as a single table partitioned in the same way.
+The outputs of tfs2pd are stored one Parquet file per optics table.
+
+The file _metadata.json keeps the time range of each partition, so that a query reads only the partitions
+and the columns requested, memory-mapping the files.
+
+pyarrow is needed.
+
+===Example===
+from cl2pd import exportData
+raw_data = importData.cals2pd(myVariables, t1, t2)
+exportData.pd2parquet(raw_data, '/eos/user/s/sterbini/myDataset')                  # partitioned by day
+exportData.pd2parquet(raw_data, '/eos/user/s/sterbini/myDataset', partitionBy='fill',
+                      fills=importData.LHCFillsByNumber([6400, 6401]))               # partitioned by fill
+
+store = exportData.ParquetStore('/eos/user/s/sterbini/myDataset')
+store.variables
+myDF = store.query(['LHC.BCTDC.A6R4.B1:BEAM_INTENSITY'], t1, t2)
+'''
+import json
+import os
+import re
+
+import pandas as pd
+import numpy as np
+
+_METADATA_FILE='_metadata.json'
+
+
+def _toUTC(t):
+    if t is None:
+        return None
+    t=pd.Timestamp(t)
+    if t.tz==None:
+        return t.tz_localize('UTC')
+    return t.tz_convert('UTC')
+
+
+def _nanoseconds(index):
+    '''
+    Return the int64 UTC nanoseconds of a (UTC-localized or naive UTC) DatetimeIndex.
+    '''
+    return np.asarray(index.values.astype('datetime64[ns]').astype(np.int64))
+
+
+def _partitionKeys(index, partitionBy, fills):
+    '''
+    Return an array with the partition key of each timestamp of index.
+    '''
+    if partitionBy=='day':
+        return np.asarray(pd.DatetimeIndex(index).strftime('%Y-%m-%d'))
+    if partitionBy=='fill':
+        if fills is None:
+            raise ValueError("The fills (e.g. from importData.LHCFillsByNumber) are needed for partitionBy='fill'.")
+        summary=fills[fills['mode']=='FILL'].sort_values('startTime')
+        starts=_nanoseconds(pd.DatetimeIndex(summary['startTime']))
+        # the fills not yet dumped are open-ended
+        ends=pd.DatetimeIndex(summary['endTime'])
+        ends=np.where(pd.isnull(ends), np.iinfo(np.int64).max, _nanoseconds(ends.fillna(pd.Timestamp(0, tz='UTC'))))
+        times=_nanoseconds(index)
+        position=np.searchsorted(starts, times, side='right')-1
+        inFill=(position>=0) & (times<=ends[np.clip(position, 0, None)])
+        names=np.array(['fill_' + str(i) for i in summary.index]+['nofill'])
+        return names[np.where(inFill, position, len(names)-1)]
+    raise ValueError("partitionBy should be 'day' or 'fill'.")
+
+
+def _valuesToArrow(values):
+    '''
+    Return a pyarrow array from the values of a column (scalars, strings or vectors) and its kind.
+    '''
+    import pyarrow as pa
+    if values.dtype!=object:
+        return pa.array(values), 'scalar'
+    if len(values) and all([isinstance(i, (np.ndarray, list, tuple)) for i in values]):
+        lengths=np.array([len(i) for i in values])
+        if np.all(lengths==lengths[0]) and lengths[0]>0:
+            matrix=np.vstack(values)
+            return pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), int(lengths[0])), 'vector'
+        return pa.array([np.asarray(i) for i in values]), 'vector'
+    return pa.array([None if (not isinstance(i, str) and pd.isnull(i)) else str(i) for i in values]), 'string'
+
+
+def _arrowToValues(column, kind):
+    '''
+    Return a numpy array (object array of numpy arrays for the vectors) from a pyarrow column.
+
+    The vectors are views of the flattened child array of the list column (no per-row conversion).
+    '''
+    import pyarrow as pa
+    if kind!='vector':
+        return column.to_numpy()
+    column=column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    out=np.empty(len(column), dtype=object)
+    if len(column)==0:
+        return out
+    if pa.types.is_fixed_size_list(column.type):
+        size=column.type.list_size
+        flat=column.values.slice(column.offset*size, len(column)*size).to_numpy(zero_copy_only=False)
+        out[:]=list(flat.reshape(len(column), size))
+    else:
+        offsets=column.offsets.to_numpy()
+        flat=column.values.slice(offsets[0], offsets[-1]-offsets[0]).to_numpy(zero_copy_only=False)
+        offsets=offsets-offsets[0]
+        lengths=np.diff(offsets)
+        if (lengths==lengths[0]).all():
+            out[:]=list(flat.reshape(len(column), lengths[0]))
+        else:
+            for i, j in enumerate(np.split(flat, offsets[1:-1])):
+                out[i]=j
+    if column.null_count:
+        out[column.is_null().to_numpy(zero_copy_only=False)]=None
+    return out
+
+
+def _writePartition(myFile, table, keys=()):
+    '''
+    Write table in myFile merging it with the existing data.
+
+    A row is identified by its time and the key columns: at the same (time, keys) the new row wins.
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if os.path.exists(myFile):
+        table=pa.concat_tables([pq.read_table(myFile), table.cast(pq.read_schema(myFile))])
+    times=table.column('time').cast(pa.int64()).to_numpy()
+    if len(keys)==0:
+        # stable sort and, for the repeated times, the last written sample
+        order=np.argsort(times, kind='mergesort')
+        keep=np.append(times[order][1:]!=times[order][:-1], True)
+        order=order[keep]
+    else:
+        aux=pd.DataFrame({i: table.column(i).to_numpy(zero_copy_only=False) for i in keys})
+        aux['time']=times
+        order=np.flatnonzero(~aux.duplicated(keep='last').values)
+        order=order[np.argsort(times[order], kind='mergesort')]
+    table=table.take(pa.array(order))
+    pq.write_table(table, myFile + '.tmp')
+    os.replace(myFile + '.tmp', myFile)
+    return times[order][0], times[order][-1], table.num_rows
+
+
+def _readMetadata(path):
+    myFile=os.path.join(path, _METADATA_FILE)
+    if os.path.exists(myFile):
+        with open(myFile, 'r') as f:
+            return json.load(f)
+    return None
+
+
+def _writeMetadata(path, metadata):
+    myFile=os.path.join(path, _METADATA_FILE)
+    with open(myFile + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=1, sort_keys=True)
+    os.replace(myFile + '.tmp', myFile)
+
+
+def _folderName(name, usedFolders):
+    folder=re.sub(r'[^A-Za-z0-9.\-]', '_', str(name))
+    aux=folder
+    i=1
+    while aux in usedFolders:
+        aux=folder + '_' + str(i)
+        i=i+1
+    return aux
+
+
+def pd2parquet(myDF, path, partitionBy='day', fills=None):
+    '''
+    pd2parquet(myDF, path, partitionBy='day', fills=None)
+
+    Store an importData output in the partitioned Parquet dataset of the folder path.
+
+    myDF: output of cals2pd, calsCSV2pd, massiFile2pd (UTC DatetimeIndex) or tfs2pd.
+    partitionBy: 'day' or 'fill' (for the time series).
+    fills: dataframe of the fills as given by importData.LHCFillsByNumber or LHCFillsByTime (for partitionBy='fill').
+           The samples outside the fills are stored in the partition 'nofill'.
+
+    The dataset can be extended calling again the function: the samples of an existing variable
+    are merged with the stored ones (the new ones win at the same time). For the outputs with repeated
+    timestamps a row is identified by the time and the non-float columns (e.g. FILL, Experiment and Bunch
+    of massiFile2pd): exporting twice the same output does not duplicate the rows.
+    '''
+    import pyarrow as pa
+    if not os.path.exists(path):
+        os.makedirs(path)
+    metadata=_readMetadata(path)
+    if metadata is None:
+        metadata={'format': 1, 'partitionBy': partitionBy, 'variables': {}, 'tables': {}, 'tfs': {}}
+    elif metadata['partitionBy']!=partitionBy and not 'TABLE' in myDF.columns:
+        raise ValueError('The dataset is partitioned by ' + metadata['partitionBy'] + '.')
+
+    if 'TABLE' in myDF.columns:
+        _tfs2parquet(myDF, path, metadata)
+        _writeMetadata(path, metadata)
+        return
+
+    if not isinstance(myDF.index, pd.DatetimeIndex):
+        raise ValueError('The index of myDF should be a DatetimeIndex.')
+    index=myDF.index
+    if index.tz is None:
+        index=index.tz_localize('UTC')
+
+    if index.is_unique:
+        # one folder per variable
+        usedFolders=set([i['folder'] for i in metadata['variables'].values()])
+        for name in myDF.columns:
+            series=myDF[name]
+            mask=np.asarray(series.notnull())
+            if not mask.any():
+                continue
+            values, kind=_valuesToArrow(series.values[mask])
+            times=pa.array(_nanoseconds(index[mask]), type=pa.int64()).cast(pa.timestamp('ns', tz='UTC'))
+            table=pa.Table.from_arrays([times, values], names=['time', 'value'])
+            if name not in metadata['variables']:
+                folder=_folderName(name, usedFolders)
+                usedFolders.add(folder)
+                metadata['variables'][name]={'folder': folder, 'kind': kind, 'partitions': {}}
+            info=metadata['variables'][name]
+            os.makedirs(os.path.join(path, info['folder']), exist_ok=True)
+            keys=_partitionKeys(index[mask], partitionBy, fills)
+            for key in np.unique(keys):
+                first, last, rows=_writePartition(os.path.join(path, info['folder'], key + '.parquet'),
+                                                  table.filter(pa.array(keys==key)))
+                info['partitions'][key]=[int(first), int(last), int(rows)]
+    else:
+        # a single table (repeated timestamps, e.g. several bunches at the same time)
+        aux=myDF.copy()
+        aux.index=index
+        table=pa.Table.from_pandas(aux.reset_index(drop=True), preserve_index=False)
+        times=pa.array(_nanoseconds(index), type=pa.int64()).cast(pa.timestamp('ns', tz='UTC'))
+        table=table.append_column('time', times)
+        name='table'
+        if name not in metadata['tables']:
+            # the rows are identified by the time and the non-float columns (e.g. FILL, Experiment, Bunch)
+            keyColumns=[str(i) for i in myDF.columns if myDF[i].dtype.kind not in 'fc']
+            metadata['tables'][name]={'folder': '_table', 'columns': [str(i) for i in myDF.columns],
+                                      'keys': keyColumns if len(keyColumns) else [str(i) for i in myDF.columns],
+                                      'partitions': {}}
+        info=metadata['tables'][name]
+        os.makedirs(os.path.join(path, info['folder']), exist_ok=True)
+        keys=_partitionKeys(index, partitionBy, fills)
+        for key in np.unique(keys):
+            first, last, rows=_writePartition(os.path.join(path, info['folder'], key + '.parquet'),
+                                              table.filter(pa.array(keys==key)),
+                                              info.get('keys', info['columns']))
+            info['partitions'][key]=[int(first), int(last), int(rows)]
+    _writeMetadata(path, metadata)
+
+
+def _tfs2parquet(myDF, path, metadata):
+    '''
+    Store a tfs2pd output: one Parquet file per optics table, the header in the metadata.
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.join(path, '_tfs'), exist_ok=True)
+    for fileName, row in myDF.iterrows():
+        folder=_folderName(os.path.basename(str(fileName)), set([i['file'] for i in metadata['tfs'].values()
+                                                                     if i['source']!=fileName]))
+        optics=row['TABLE']
+        table=pa.Table.from_pandas(optics.reset_index(drop=True), preserve_index=False)
+        pq.write_table(table, os.path.join(path, '_tfs', folder + '.parquet'))
+        header=dict((str(i), row[i]) for i in myDF.columns if i!='TABLE' and isinstance(row[i], (str, float, int)))
+        metadata['tfs'][str(fileName)]={'source': fileName, 'file': folder, 'header': header}
+
+
+class ParquetStore:
+    '''
+    Lazy access to a dataset written by pd2parquet.
+
+    Opening the store reads only the metadata. The queries read only the partitions overlapping
+    the requested time interval and only the requested columns (memory-mapped files).
+
+    ===Example===
+    store = exportData.ParquetStore('/eos/user/s/sterbini/myDataset')
+    store.variables
+    myDF = store.query(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2)   # '%' patterns are accepted
+    massi = store.queryTable(['Luminosity [Hz/ub]', 'Bunch'], t1, t2)
+    twiss = store.tfs()
+    '''
+
+    def __init__(self, path):
+        self.path=path
+        self.metadata=_readMetadata(path)
+        if self.metadata is None:
+            raise ValueError('No dataset in ' + str(path) + '.')
+
+    @property
+    def variables(self):
+        return sorted(self.metadata['variables'])
+
+    def _partitionFiles(self, info, t1, t2):
+        files=[]
+        for key in sorted(info['partitions']):
+            first, last, rows=info['partitions'][key]
+            if (t1 is not None and last<t1.value) or (t2 is not None and first>t2.value):
+                continue
+            files.append(os.path.join(self.path, info['folder'], key + '.parquet'))
+        return files
+
+    def _read(self, files, columns, t1, t2):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        filters=[]
+        if t1 is not None:
+            filters.append(('time', '>=', t1))
+        if t2 is not None:
+            filters.append(('time', '<=', t2))
+        tables=[pq.read_table(i, columns=columns, memory_map=True, filters=filters if len(filters) else None)
+                for i in files]
+        if len(tables)==0:
+            return None
+        return pa.concat_tables(tables)
+
+    def query(self, variables=None, t1=None, t2=None):
+        '''
+        Return a pandas dataframe (as cals2pd) with the variables within [t1,t2] (None for no limit).
+
+        variables can contain the '%' search pattern. The index timestamps are UTC-localized.
+        '''
+        import fnmatch
+        t1, t2=_toUTC(t1), _toUTC(t2)
+        if variables is None:
+            variables=self.variables
+        elif isinstance(variables, str):
+            variables=[variables]
+        names=[]
+        for i in variables:
+            if '%' in i:
+                names=names+[j for j in self.variables if fnmatch.fnmatchcase(j, i.replace('%', '*'))]
+            elif i in self.metadata['variables']:
+                names.append(i)
+        myList=[]
+        for name in sorted(set(names)):
+            info=self.metadata['variables'][name]
+            table=self._read(self._partitionFiles(info, t1, t2), ['time', 'value'], t1, t2)
+            if table is None or table.num_rows==0:
+                continue
+            times=pd.DatetimeIndex(table.column('time').cast('int64').to_numpy().astype('datetime64[ns]')).tz_localize('UTC')
+            myList.append(pd.Series(_arrowToValues(table.column('value'), info['kind']), index=times, name=name))
+        if len(myList)==0:
+            return pd.DataFrame()
+        myDF=pd.concat(myList, axis=1, sort=True)
+        myDF.index.name=None
+        return myDF
+
+    def queryTable(self, columns=None, t1=None, t2=None, name='table'):
+        '''
+        Return a pandas dataframe with the columns of a stored table (e.g. a massiFile2pd output) within [t1,t2].
+        '''
+        t1, t2=_toUTC(t1), _toUTC(t2)
+        info=self.metadata['tables'][name]
+        if columns is None:
+            columns=info['columns']
+        table=self._read(self._partitionFiles(info, t1, t2), list(columns)+['time'], t1, t2)
+        if table is None:
+            return pd.DataFrame(columns=columns)
+        times=pd.DatetimeIndex(table.column('time').cast('int64').to_numpy().astype('datetime64[ns]')).tz_localize('UTC')
+        myDF=table.drop_columns(['time']).to_pandas()
+        myDF.index=times
+        return myDF
+
+    def tfs(self):
+        '''
+        Return the stored tfs2pd outputs as a dataframe with the same format of tfs2pd.
+        '''
+        import pyarrow.parquet as pq
+        rows=[]
+        for fileName in sorted(self.metadata['tfs']):
+            info=self.metadata['tfs'][fileName]
+            aux=dict(info['header'])
+            optics=pq.read_table(os.path.join(self.path, '_tfs', info['file'] + '.parquet'), memory_map=True).to_pandas()
+            if 'S' in optics.columns:
+                optics.index=optics['S'].values
+            aux['TABLE']=optics
+            aux['FILE_NAME']=fileName
+            rows.append(aux)
+        if len(rows)==0:
+            return pd.DataFrame()
+        globalDF=pd.DataFrame(rows).set_index('FILE_NAME')
+        globalDF.index.name=''
+        return globalDF
+
+
+def parquet2pd(path, variables=None, t1=None, t2=None):
+    '''
+    Return the variables within [t1,t2] from the dataset in path (see ParquetStore.query).
+    '''
+    return ParquetStore(path).query(variables, t1, t2)
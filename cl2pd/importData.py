@@ -1,8 +1,13 @@
 import pandas as pd 
 import numpy as np
 import os
+import time
+import threading
 # Fundamental contribution by R. De Maria et al.
 import pytimber
+from . import profiling
+from .sparseFrame import SparseFrame, _concatValues
+from .calsCSV import _calsCSVVariables, _calsCSV2ipc
 
 # TODO: discuss about the possible problem if the user has already defined a variable named 'cals' 
 cals=pytimber.LoggingDB()
@@ -16,38 +21,31 @@ def _smartList(myList):
     _smartList('CPS.LSA:%')
 
     '''
-    if isinstance(myList,str):
-        if '%' in myList:
-            return cals.search(myList)
-        else:
-            return [myList]
-    
-    newList=[]
-    for i in myList:
-        if '%' in i:
-            newList=newList+cals.search(i)
-        else:
-            newList=newList+[i]
-    return list(np.unique(newList))
+    with profiling.stage('search'):
+        if isinstance(myList,str):
+            if '%' in myList:
+                return cals.search(myList)
+            else:
+                return [myList]
 
-def _noSplitcals2pd(listOfVariables, t1, t2, fundamental='', verbose=False):
+        newList=[]
+        for i in myList:
+            if '%' in i:
+                newList=newList+cals.search(i)
+            else:
+                newList=newList+[i]
+        return list(np.unique(newList))
+
+def _calsGet(listOfVariables, t1, t2, fundamental='', verbose=False):
     '''
-    It is a cals2pd without splitting feature.
+    Return the list of the variables and the raw CALS data (dictionary {variable: (timestamps, values)})
+    within the interval [t1,t2].
 
     This function is supposed to be private.
 
     t1 and t2 are pandas datetime, therefore you can use tz-aware expression.
     Tz-naive expressions will be consider UTC-localized.
-
-    This function returns a pandas dataframe of the listOfVariables within the interval [t1,t2].
-    It can be used in the verbose mode if the corresponding flag is True.
-    It can be used to filter fundamentals (especially intended for the injectors).
-    The index timestamps of the output are UTC-localized.
     '''
-
-    if len(listOfVariables)==0:
-        return pd.DataFrame()
-    
     listOfVariables=_smartList(listOfVariables)
     
     if t1.tz==None:
@@ -67,29 +65,169 @@ def _noSplitcals2pd(listOfVariables, t1, t2, fundamental='', verbose=False):
         
     # Retrieving the variables
     listOfVariableToAdd=list(set(listOfVariables))
-    if fundamental=='':
-        if verbose: print('No fundamental filter.')
-        DATA=cals.get(listOfVariableToAdd,t1,t2 )
-    else:
-        DATA=cals.get(listOfVariableToAdd,t1,t2,fundamental)
+    with profiling.stage('cals.get'):
+        if fundamental=='':
+            if verbose: print('No fundamental filter.')
+            DATA=cals.get(listOfVariableToAdd,t1,t2 )
+        else:
+            DATA=cals.get(listOfVariableToAdd,t1,t2,fundamental)
+
+    if profiling.enabled() and DATA!={}:
+        profiling.count('variables', len(DATA))
+        profiling.count('samples', sum([len(DATA[i][0]) for i in DATA]))
+        profiling.count('bytes', sum([np.asarray(DATA[i][0]).nbytes+np.asarray(DATA[i][1]).nbytes for i in DATA]))
+    return listOfVariableToAdd, DATA
+
+def _noSplitcals2pd(listOfVariables, t1, t2, fundamental='', verbose=False):
+    '''
+    It is a cals2pd without splitting feature.
+
+    This function is supposed to be private.
+
+    t1 and t2 are pandas datetime, therefore you can use tz-aware expression.
+    Tz-naive expressions will be consider UTC-localized.
+
+    This function returns a pandas dataframe of the listOfVariables within the interval [t1,t2].
+    It can be used in the verbose mode if the corresponding flag is True.
+    It can be used to filter fundamentals (especially intended for the injectors).
+    The index timestamps of the output are UTC-localized.
+    '''
+
+    if len(listOfVariables)==0:
+        return pd.DataFrame()
+
+    listOfVariableToAdd, DATA=_calsGet(listOfVariables, t1, t2, fundamental, verbose)
     myDataFrame=pd.DataFrame()
 
     if DATA!={}:
         for i in listOfVariableToAdd:
             if verbose: print('Elaborating variable: '+ i)
-            auxDataFrame=pd.DataFrame()                
-            auxDataFrame[i]=pd.Series(DATA[i][1].tolist(),pd.to_datetime(DATA[i][0],unit='s'))
+            with profiling.stage('series'):
+                auxDataFrame=pd.DataFrame()
+                auxDataFrame[i]=pd.Series(DATA[i][1].tolist(),pd.to_datetime(DATA[i][0],unit='s'))
             # important function to keep in mind
-            myDataFrame=pd.merge(myDataFrame,auxDataFrame, how='outer',left_index=True,right_index=True)
+            with profiling.stage('merge'):
+                myDataFrame=pd.merge(myDataFrame,auxDataFrame, how='outer',left_index=True,right_index=True)
         
     #Time-zone localization
     if len(myDataFrame):
         myDataFrame.index=myDataFrame.index.tz_localize('UTC')
     return myDataFrame
     
-def cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False): 
+def _sparsecals2pd(listOfVariables, t1, t2, fundamental='', verbose=False):
+    '''
+    It is a _noSplitcals2pd returning a SparseFrame.
+
+    This function is supposed to be private.
+    '''
+    if len(listOfVariables)==0:
+        return SparseFrame()
+    listOfVariableToAdd, DATA=_calsGet(listOfVariables, t1, t2, fundamental, verbose)
+    with profiling.stage('series'):
+        return SparseFrame.fromCals(DATA)
+
+# Correspondence between the pandas aggregation functions and the CALS scaling algorithms
+_scaleAlgorithms={'mean':'AVG', 'min':'MIN', 'max':'MAX', 'sum':'SUM', 'count':'COUNT'}
+
+def _scaledcals2pd(listOfVariables, t1, t2, agg, funcs, verbose=False):
+    '''
+    Return the listOfVariables aggregated by the backend (CALS scaled query) within the interval [t1,t2].
+
+    This function is supposed to be private.
+
+    The columns are a (variable, function) MultiIndex as for the local aggregation of cals2pd.
+    It returns None if the aggregation cannot be done by the backend.
+    '''
+    offset=_aggOffset(agg)
+    if not hasattr(cals, 'getScaled') or not all([i in _scaleAlgorithms for i in funcs]):
+        return None
+    if not isinstance(offset, pd.offsets.Tick):
+        # the calendar frequencies (e.g. 'W', 'MS') are aggregated locally
+        return None
+    seconds=pd.Timedelta(offset).total_seconds()
+    for scaleInterval, intervalSeconds in [('DAY',86400), ('HOUR',3600), ('MINUTE',60), ('SECOND',1)]:
+        if seconds>=intervalSeconds and seconds%intervalSeconds==0:
+            scaleSize=str(int(seconds//intervalSeconds))
+            break
+    else:
+        return None
+
+    listOfVariables=_smartList(listOfVariables)
+    if t1.tz==None: t1=t1.tz_localize('UTC')
+    if t2.tz==None: t2=t2.tz_localize('UTC')
+    # pyTimber needs CET as internal variable
+    t1=t1.astimezone('CET')
+    t2=t2.astimezone('CET')
+
+    myList=[]
+    try:
+        for i in funcs:
+            if verbose: print('Scaled query: ' + _scaleAlgorithms[i] + ' over ' + scaleSize + ' ' + scaleInterval)
+            with profiling.stage('cals.getScaled'):
+                DATA=cals.getScaled(listOfVariables, t1, t2, scaleAlgorithm=_scaleAlgorithms[i],
+                                    scaleInterval=scaleInterval, scaleSize=scaleSize)
+            for j in listOfVariables:
+                if j in DATA:
+                    myList.append(pd.Series(DATA[j][1], pd.to_datetime(DATA[j][0], unit='s', utc=True), name=(j, i)))
+    except Exception as e:
+        if verbose: print('The scaled query failed (' + repr(e) + '), the aggregation is done locally.')
+        return None
+    if len(myList)==0:
+        return pd.DataFrame()
+    myDF=pd.concat(myList, axis=1)
+    myDF.columns=pd.MultiIndex.from_tuples(myDF.columns)
+    return myDF
+
+def _aggregate(myDF, agg, funcs):
     '''
-    cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False)
+    Return the numeric columns of myDF aggregated in bins of agg (fixed frequencies are aligned to the epoch) with funcs.
+    '''
+    aux=myDF.select_dtypes(include=[np.number])
+    if len(aux)==0:
+        return pd.DataFrame()
+    if isinstance(pd.tseries.frequencies.to_offset(agg), pd.offsets.Tick):
+        return aux.resample(agg, origin='epoch').agg(funcs)
+    # calendar frequencies (e.g. 'W', 'MS') are anchored by pandas
+    return aux.resample(agg).agg(funcs)
+
+def _aggOffset(agg):
+    '''
+    Return the pandas offset of agg (ValueError with a clear message if agg is not a pandas frequency).
+
+    This function is supposed to be private.
+    '''
+    try:
+        return pd.tseries.frequencies.to_offset(agg)
+    except (ValueError, TypeError):
+        raise ValueError('agg should be a pandas frequency (e.g. \'1min\', \'1h\', \'W\', \'MS\'), not ' + repr(agg) + '.')
+
+def _aggregationEdges(t1, t2, agg, nWindows):
+    '''
+    Return the inner edges of about nWindows time windows of [t1, t2] such that no bin of agg is shared by two windows
+    (a sample at an edge belongs to the following window).
+
+    This function is supposed to be private.
+    '''
+    offset=_aggOffset(agg)
+    if isinstance(offset, pd.offsets.Tick):
+        times=pd.to_datetime(np.linspace(t1.value, t2.value, nWindows+1), utc=True).floor(offset)
+        return sorted(set([i for i in times if (i>t1) & (i<t2)]))
+    # The bins of the calendar frequencies change at midnight: the midnights where the bin changes are clean edges
+    days=pd.date_range(t1.floor('D')+pd.Timedelta(days=1), t2, freq='D', inclusive='left')
+    days=days[days>t1]
+    if len(days)==0:
+        return []
+    points=(days-pd.Timedelta(1)).append(days).sort_values()
+    groups=pd.Series(0, index=points).groupby(pd.Grouper(freq=offset)).ngroup().values
+    edges=days[groups[0::2]!=groups[1::2]]
+    if len(edges)>nWindows-1:
+        edges=edges[np.unique(np.linspace(0, len(edges)-1, max(nWindows-1, 1)).astype(int))]
+    return list(edges)
+
+def cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False, agg=None, funcs=['mean'],
+            sparse=False): 
+    '''
+    cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False, agg=None, funcs=['mean'], sparse=False)
 
     This is the most important function of the importData class.
 
@@ -102,6 +240,19 @@ def cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False):
     It can be used to filter fundamentals (especially intended for the injectors).
     It can be used in the verbose mode if the corresponding flag is True.
     The data extraction can be done splitting it in several n intervals (split=n). 
+    The time spent in each stage of the extraction can be recorded with cl2pd.profiling.record().
+
+    If agg is specified (e.g. agg='1min'), the numeric variables are aggregated in bins of agg
+    with the functions in funcs (e.g. ['mean','max']) and the columns are a (variable, function) MultiIndex.
+    When possible the aggregation is done by CALS (scaled query, funcs in 'mean','min','max','sum','count'),
+    otherwise each time window is reduced as it arrives (the windows are aligned to the bins),
+    so that the raw data of the full interval are never kept in memory.
+    In this case the interval is split in windows of about one day (or in split windows if they are more).
+    agg can also be a calendar frequency (e.g. 'W', 'MS'): the windows are then cut where the bins change.
+
+    If sparse is True, a cl2pd.sparseFrame.SparseFrame is returned: each variable is kept as its own
+    (times, values) run and the wide dataframe is materialized only on request (toDataFrame, asof).
+    This is intended for the extraction of many on-change variables together with fast ones.
 
     ===Example===     
 
@@ -111,9 +262,53 @@ def cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False):
     raw_data = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY','CPS.%:USER'],t1,t2)
     # By default the index timezone is UTC but, even if not encouraged, you can chance the index time zone.
     raw_data.index=raw_data.index.tz_convert('CET')
+
+    # one month of per-minute mean and max
+    trend = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'],t1,t1+pd.Timedelta(days=30),split=30,
+                               agg='1min',funcs=['mean','max'])
+
+    # many on-change settings over a full fill
+    myData = importData.cals2pd(['LHC.BCTDC.A6R4.B1:BEAM_INTENSITY','RPMBB.%:I_MEAS'],t1,t2,sparse=True)
+    myData.asof(pd.date_range(t1, t2, freq='1min'))
     '''
     if split<1: split=1
 
+    if sparse:
+        if agg is not None:
+            raise ValueError('sparse and agg cannot be used together.')
+        if split==1:
+            return _sparsecals2pd(listOfVariables, t1, t2, fundamental, verbose)
+        times= pd.to_datetime(np.linspace(t1.value, t2.value, split+1))
+        myList=[]
+        for i in range(len(times)-1):
+            if verbose: print('Time window: '+str(i+1)) 
+            myList.append(_sparsecals2pd(listOfVariables,times[i],times[i+1], fundamental=fundamental, verbose=verbose))
+        with profiling.stage('concat'):
+            return SparseFrame.concat(myList)
+
+    if agg is not None:
+        if fundamental=='':
+            myDF=_scaledcals2pd(listOfVariables, t1, t2, agg, funcs, verbose)
+            if myDF is not None:
+                return myDF.sort_index(axis=1)
+        if t1.tz==None: t1=t1.tz_localize('UTC')
+        if t2.tz==None: t2=t2.tz_localize('UTC')
+        # Windows of about one day (at least split), the inner edges are aligned to the bins,
+        # so that no bin is shared by two windows
+        nWindows=max(split, int(np.ceil((t2-t1)/pd.Timedelta(days=1))))
+        times=[t1]+_aggregationEdges(t1, t2, agg, nWindows)+[t2]
+        myList=[]
+        for i in range(len(times)-1):
+            if verbose: print('Time window: '+str(i+1))
+            aux=_noSplitcals2pd(listOfVariables,times[i],times[i+1], fundamental=fundamental, verbose=verbose)
+            if len(aux) and i<len(times)-2:
+                # the right edge belongs to the next window
+                aux=aux[aux.index<times[i+1]]
+            with profiling.stage('aggregate'):
+                myList.append(_aggregate(aux, agg, funcs))
+        myDF=pd.concat(myList) if len(myList) else pd.DataFrame()
+        return myDF.sort_index(axis=1)
+
     if split==1: 
         myDF=_noSplitcals2pd(listOfVariables, t1, t2, fundamental, verbose)
     else:
@@ -121,10 +316,245 @@ def cals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False):
         myDF=pd.DataFrame()
         for i in range(len(times)-1):
             if verbose: print('Time window: '+str(i+1)) 
+            if profiling.enabled():
+                start=time.perf_counter()
             aux=_noSplitcals2pd(listOfVariables,times[i],times[i+1], fundamental=fundamental, verbose=verbose)
-            myDF=pd.concat([myDF,aux])
+            if profiling.enabled():
+                profiling.window({'function': 'cals2pd', 'window': i, 't1': times[i], 't2': times[i+1],
+                                  'seconds': time.perf_counter()-start,
+                                  'rows': len(aux), 'samples': int(aux.count().sum()) if len(aux) else 0})
+            with profiling.stage('concat'):
+                myDF=pd.concat([myDF,aux])
+    return myDF.sort_index(axis=1)
+
+async def _inExecutor(function, *args, timeout=None):
+    '''
+    Run function(*args) in the default executor of the running event loop and return its result.
+
+    This function is supposed to be private.
+    If the result is not available within timeout seconds asyncio.TimeoutError is raised.
+    On timeout or cancellation the running backend call is not interrupted, its result is discarded.
+    '''
+    import asyncio
+    import functools
+    loop=asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(None, functools.partial(function, *args)), timeout)
+
+async def acals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False, agg=None, funcs=['mean'],
+                   maxConcurrent=4, timeout=None):
+    '''
+    acals2pd(listOfVariables, t1, t2, fundamental='', split=1, verbose=False, agg=None, funcs=['mean'],
+             maxConcurrent=4, timeout=None)
+
+    Coroutine version of cals2pd: the extraction does not block the event loop.
+
+    The split windows are fetched concurrently (at most maxConcurrent at the same time)
+    and each window has to be fetched within timeout seconds (asyncio.TimeoutError otherwise).
+    If agg is specified the full cals2pd is run in the executor (timeout applies to it).
+    The coroutine can be cancelled (e.g. when a dashboard panel is closed).
+
+    ===Example===
+    raw_data = await importData.acals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2, split=10, timeout=30)
+    '''
+    import asyncio
+
+    if agg is not None:
+        return await _inExecutor(cals2pd, listOfVariables, t1, t2, fundamental, split, verbose, agg, funcs,
+                                 timeout=timeout)
+    if split<1: split=1
+    listOfVariables=await _inExecutor(_smartList, listOfVariables, timeout=timeout)
+    if split==1:
+        times=[t1, t2]
+    else:
+        times= pd.to_datetime(np.linspace(t1.value, t2.value, split+1))
+    semaphore=asyncio.Semaphore(maxConcurrent)
+
+    async def fetch(i):
+        async with semaphore:
+            if verbose: print('Time window: '+str(i+1)) 
+            return await _inExecutor(_noSplitcals2pd, listOfVariables, times[i], times[i+1], fundamental, verbose,
+                                     timeout=timeout)
+
+    myList=await asyncio.gather(*[fetch(i) for i in range(len(times)-1)])
+    myDF=pd.concat(myList) if len(myList)>1 else myList[0]
     return myDF.sort_index(axis=1)
 
+# Cache of lastValues: {(variables, at, fundamental): (time of the extraction, ttl, result)}
+_lastValuesCache={}
+_lastValuesCacheLock=threading.Lock()
+
+def lastValues(listOfVariables, at=None, ttl=5., fundamental='', verbose=False):
+    '''
+    lastValues(listOfVariables, at=None, ttl=5., fundamental='', verbose=False)
+
+    Return the last value before the time at (by default now) of each variable in listOfVariables.
+
+    The '%' search patterns are resolved once and all the variables are retrieved with a single CALS request.
+    It returns a pandas dataframe indexed by variable with the columns 'value' and 'timestamp' (UTC-localized).
+    The variables without data before at have NaN value and NaT timestamp.
+
+    The results are cached for ttl seconds (ttl=0 to disable the cache), this is intended for dashboards
+    refreshing every few seconds.
+
+    ===Example===
+    TEMP_VAR = list(variablesDF.LHC[variablesDF.LHC['Description'].str.contains('temperature')]['Variable'])
+    myDF = importData.lastValues(TEMP_VAR)
+    '''
+    if isinstance(listOfVariables, str):
+        listOfVariables=[listOfVariables]
+    key=(tuple(listOfVariables), at, fundamental)
+    if ttl>0:
+        with _lastValuesCacheLock:
+            aux=_lastValuesCache.get(key)
+        if aux is not None and time.time()-aux[0]<ttl:
+            if verbose: print('Last values from the cache.')
+            return aux[2].copy()
+
+    extractionTime=time.time()
+    listOfVariables=_smartList(listOfVariables)
+    if at is None:
+        t1=pd.Timestamp.now(tz='CET')
+    elif at.tz==None:
+        t1=at.tz_localize('UTC').astimezone('CET')
+    else:
+        t1=at.astimezone('CET')
+
+    with profiling.stage('cals.get'):
+        if fundamental=='':
+            DATA=cals.get(listOfVariables, t1, 'last')
+        else:
+            DATA=cals.get(listOfVariables, t1, 'last', fundamental)
+
+    values, timestamps=[], []
+    for i in listOfVariables:
+        if i in DATA and len(DATA[i][0]):
+            timestamps.append(DATA[i][0][-1])
+            values.append(DATA[i][1][-1])
+        else:
+            timestamps.append(np.nan)
+            values.append(np.nan)
+    myDF=pd.DataFrame({'value': values, 'timestamp': pd.to_datetime(timestamps, unit='s', utc=True)},
+                      index=listOfVariables, columns=['value', 'timestamp'])
+
+    if ttl>0:
+        with _lastValuesCacheLock:
+            # the expired entries are evicted, so that the cache does not grow in a long-running dashboard
+            now=time.time()
+            for i in [i for i in _lastValuesCache if now-_lastValuesCache[i][0]>=_lastValuesCache[i][1]]:
+                del _lastValuesCache[i]
+            _lastValuesCache[key]=(extractionTime, ttl, myDF)
+    return myDF.copy()
+
+async def alastValues(listOfVariables, at=None, ttl=5., fundamental='', verbose=False, timeout=None):
+    '''
+    alastValues(listOfVariables, at=None, ttl=5., fundamental='', verbose=False, timeout=None)
+
+    Coroutine version of lastValues (asyncio.TimeoutError if the values are not retrieved within timeout seconds).
+
+    ===Example===
+    myDF = await importData.alastValues(TEMP_VAR, timeout=5)
+    '''
+    return await _inExecutor(lastValues, listOfVariables, at, ttl, fundamental, verbose, timeout=timeout)
+
+def _timestamps2ns(timestamps):
+    '''
+    Return the int64 nanoseconds of the CALS unix timestamps (float seconds) keeping the sub-microsecond digits.
+    '''
+    timestamps=np.asarray(timestamps, dtype=float)
+    seconds=np.floor(timestamps)
+    return seconds.astype(np.int64)*1000000000+np.round((timestamps-seconds)*1e9).astype(np.int64)
+
+def _calsData2arrow(name, timestamps, values):
+    '''
+    Return a pyarrow RecordBatch (variable, time, value, vector, string) of a single variable.
+
+    The numeric values and the rows of the vector values are wrapped without copies when possible.
+    '''
+    import pyarrow as pa
+    n=len(timestamps)
+    values=np.asarray(values)
+    variable=pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int32)), pa.array([name]))
+    times=pa.array(_timestamps2ns(timestamps)).cast(pa.timestamp('ns', tz='UTC'))
+    value=pa.nulls(n, pa.float64())
+    vector=pa.nulls(n, pa.list_(pa.float64()))
+    string=pa.nulls(n, pa.string())
+    if values.ndim==2:
+        matrix=np.ascontiguousarray(values, dtype=float)
+        offsets=pa.array(np.arange(0, matrix.size+1, matrix.shape[1], dtype=np.int32))
+        vector=pa.ListArray.from_arrays(offsets, pa.array(matrix.ravel()))
+    elif values.dtype.kind in 'fiub':
+        value=pa.array(values.astype(float, copy=False))
+    elif values.dtype.kind in 'OU' and n and isinstance(values[0], np.ndarray):
+        vector=pa.array([np.asarray(i, dtype=float) for i in values], type=pa.list_(pa.float64()))
+    else:
+        string=pa.array([str(i) for i in values], type=pa.string())
+    return pa.RecordBatch.from_arrays([variable, times, value, vector, string],
+                                      names=['variable', 'time', 'value', 'vector', 'string'])
+
+def cals2arrow(listOfVariables, t1, t2, fundamental='', split=1, verbose=False):
+    '''
+    cals2arrow(listOfVariables, t1, t2, fundamental='', split=1, verbose=False)
+
+    Return the listOfVariables within the interval [t1,t2] as a pyarrow Table in long format.
+
+    The columns are 'variable' (dictionary-encoded), 'time' (UTC nanoseconds) and the value in
+    'value' (numeric variables, float64), 'vector' (vector variables, list of float64) or 'string' (the others).
+    The table is made of one record batch per variable and time window built directly from the CALS arrays,
+    without the Series construction and the merge of cals2pd: it can be consumed by pyarrow-based tools
+    (e.g. polars.from_arrow, duckdb) or converted in the cals2pd wide format with arrow2pd.
+
+    The arguments are the ones of cals2pd. pyarrow is needed.
+
+    ===Example===
+    table = importData.cals2arrow(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2)
+    raw_data = importData.arrow2pd(table)
+    '''
+    import pyarrow as pa
+    if split<1: split=1
+    times=pd.to_datetime(np.linspace(t1.value, t2.value, split+1)) if split>1 else [t1, t2]
+    batches=[]
+    for i in range(len(times)-1):
+        if verbose and split>1: print('Time window: '+str(i+1))
+        listOfVariableToAdd, DATA=_calsGet(listOfVariables, times[i], times[i+1], fundamental, verbose)
+        for j in sorted(DATA):
+            if len(DATA[j][0]):
+                batches.append(_calsData2arrow(j, DATA[j][0], DATA[j][1]))
+    if len(batches)==0:
+        return _calsData2arrow('', [], np.array([])).schema.empty_table()
+    return pa.Table.from_batches(batches)
+
+def arrow2pd(table):
+    '''
+    Return the cals2pd-like pandas dataframe (one column per variable, UTC-localized index) of a cals2arrow table.
+
+    The variable of each row is decoded, therefore the table can be re-chunked or combined (e.g. combine_chunks).
+    '''
+    import pyarrow as pa
+    from .exportData import _arrowToValues
+    if table.num_rows==0:
+        return pd.DataFrame()
+    names=np.concatenate([i.dictionary_decode().to_numpy(zero_copy_only=False) if pa.types.is_dictionary(i.type)
+                          else i.to_numpy(zero_copy_only=False) for i in table.column('variable').chunks])
+    times=table.column('time').cast(pa.int64()).to_numpy()
+    # rows grouped by variable and sorted by time (stable: at the same time the first row is kept)
+    uniques, codes=np.unique(names.astype(str), return_inverse=True)
+    order=np.lexsort((times, codes))
+    bounds=np.searchsorted(codes[order], np.arange(len(uniques)+1))
+    series=[]
+    for i, name in enumerate(uniques):
+        rows=order[bounds[i]:bounds[i+1]]
+        myTable=table.take(pa.array(rows))
+        if myTable.column('value').null_count<len(rows):
+            values=myTable.column('value').to_numpy()
+        elif myTable.column('vector').null_count<len(rows):
+            values=_arrowToValues(myTable.column('vector'), 'vector')
+        else:
+            values=myTable.column('string').to_numpy()
+        index=pd.DatetimeIndex(times[rows].astype('datetime64[ns]')).tz_localize('UTC')
+        aux=pd.Series(values, index, name=name)
+        series.append(aux[~aux.index.duplicated(keep='first')])
+    return pd.concat(series, axis=1).sort_index().sort_index(axis=1)
+
 def cycleStamp2pd(variablesList,cycleStampList,verbose=False):
     '''
     Return a pandas DataFrame with the specified variables and cyclestamps.
@@ -136,16 +566,145 @@ def cycleStamp2pd(variablesList,cycleStampList,verbose=False):
     CPSDF=importData.cals2pd(['CPS.LSA:CYCLE'], startTime, endTime, fundamental='%LHC25%')
     # to get the correspind PSB of the 1st batch
     importData.cycleStamp2pd(['PSB.LSA:CYCLE'],CPSDF.index[1:]-pd.offsets.Milli(635))
+    # for long intervals see cycleCorrelation2pd
     '''
 
     myDF=pd.DataFrame()
     for i in cycleStampList:
         if verbose:
             print(i)
+        profiling.count('cycleStamps')
         aux=cals2pd(variablesList,i,i)
-        myDF=myDF.combine_first(aux)
+        with profiling.stage('combine_first'):
+            myDF=myDF.combine_first(aux)
     return myDF 
 
+def _nearestIndex(stamps, times, tolerance):
+    '''
+    Return, for each element of stamps, the position of the nearest element of times (-1 if farther than tolerance).
+
+    This function is supposed to be private.
+    stamps and times are sorted int64 arrays (ns), tolerance is an integer (ns).
+    '''
+    if len(times)==0:
+        return np.full(len(stamps), -1)
+    right=np.clip(np.searchsorted(times, stamps), 1, len(times)-1) if len(times)>1 else np.zeros(len(stamps), dtype=int)
+    left=np.maximum(right-1, 0)
+    nearest=np.where(np.abs(times[left]-stamps)<=np.abs(times[right]-stamps), left, right)
+    return np.where(np.abs(times[nearest]-stamps)<=tolerance, nearest, -1)
+
+def _cycleCorrelationWindow(reference, referenceDF, machines, w1, w2, tolerance, verbose=False):
+    '''
+    Return the per-cycle table of the reference cycles of referenceDF (already restricted to the window [w1, w2]).
+
+    This function is supposed to be private.
+    '''
+    stamps=referenceDF.index.values.astype('datetime64[ns]').astype(np.int64)
+    columns={}
+    for i in referenceDF.columns:
+        columns[(reference, i)]=referenceDF[i].values
+    columns[(reference, 'cycleStamp')]=referenceDF.index
+
+    tol=pd.Timedelta(tolerance).value
+    for machine in machines:
+        listOfVariables, offset=machines[machine][0], pd.Timedelta(machines[machine][1])
+        fundamental=machines[machine][2] if len(machines[machine])>2 else ''
+        if verbose: print('Fetching ' + machine + ' ' + str(w1+offset) + ' - ' + str(w2+offset))
+        myDF=_noSplitcals2pd(listOfVariables, w1+offset-tolerance, w2+offset+tolerance, fundamental, verbose)
+        targets=stamps+offset.value
+        with profiling.stage('correlate'):
+            # the cyclestamp of the machine is the nearest one among all its samples
+            times=myDF.index.values.astype('datetime64[ns]').astype(np.int64) if len(myDF) else np.array([], dtype=np.int64)
+            match=_nearestIndex(targets, times, tol)
+            matched=np.full(len(stamps), np.datetime64('NaT'), dtype='datetime64[ns]')
+            matched[match>=0]=times[match[match>=0]].astype('datetime64[ns]')
+            columns[(machine, 'cycleStamp')]=pd.DatetimeIndex(matched).tz_localize('UTC')
+            for i in sorted(myDF.columns):
+                # each variable is matched with its own samples (the merged index of myDF contains NaN)
+                aux=myDF[i].dropna()
+                times=aux.index.values.astype('datetime64[ns]').astype(np.int64)
+                match=_nearestIndex(targets, times, tol)
+                values=np.full(len(stamps), np.nan, dtype=object)
+                values[match>=0]=aux.values[match[match>=0]]
+                columns[(machine, i)]=values
+    myDF=pd.DataFrame(columns, index=referenceDF.index)
+    myDF.columns=pd.MultiIndex.from_tuples(myDF.columns, names=['machine', 'variable'])
+    myDF.index.name='cycleStamp'
+    return myDF.infer_objects()
+
+def iterCycleCorrelation(reference, listOfVariables, machines, t1, t2, fundamental='', tolerance=pd.Timedelta('20ms'),
+                         window=pd.Timedelta('1h'), verbose=False):
+    '''
+    iterCycleCorrelation(reference, listOfVariables, machines, t1, t2, fundamental='', tolerance=pd.Timedelta('20ms'),
+                         window=pd.Timedelta('1h'), verbose=False)
+
+    Follow the cycles of the reference machine along the injector chain, one time window at a time.
+
+    The cyclestamps of the reference machine are the ones of its listOfVariables filtered with fundamental.
+    machines is a dictionary {machine: (listOfVariables, offset)} or {machine: (listOfVariables, offset, fundamental)}:
+    the cycle of the machine corresponding to a reference cyclestamp is the nearest one to cyclestamp+offset,
+    within tolerance.
+    For each window of the interval [t1, t2] the variables of all the machines are fetched once
+    and joined with the reference cycles by sorted-array searches.
+    Each iteration yields a pandas dataframe (one row per reference cycle) with (machine, variable) columns,
+    the matched cyclestamps are in the (machine, 'cycleStamp') columns.
+    Only one window is kept in memory, so that long intervals can be processed.
+
+    ===Example===
+    t1=pd.Timestamp('2018-03-27 00:00')
+    t2=pd.Timestamp('2018-03-28 00:00')
+    machines={'PSB': (['PSB.LSA:CYCLE'], -pd.offsets.Milli(635)),
+              'SPS': (['SPS.LSA:CYCLE'], pd.offsets.Milli(1365), '%LHC25%')}
+    for myDF in importData.iterCycleCorrelation('CPS', ['CPS.LSA:CYCLE'], machines, t1, t2, fundamental='%LHC25%'):
+        myDF.to_parquet(...)
+    '''
+    if t1.tz==None: t1=t1.tz_localize('UTC')
+    if t2.tz==None: t2=t2.tz_localize('UTC')
+    listOfVariables=_smartList(listOfVariables)
+    machines={i: (_smartList(machines[i][0]),)+tuple(machines[i][1:]) for i in machines}
+    window=pd.Timedelta(window)
+    tolerance=pd.Timedelta(tolerance)
+
+    w1=t1
+    while w1<=t2:
+        w2=min(w1+window, t2)
+        if verbose: print('Time window: ' + str(w1) + ' - ' + str(w2))
+        if profiling.enabled():
+            start=time.perf_counter()
+        referenceDF=_noSplitcals2pd(listOfVariables, w1, w2, fundamental, verbose)
+        if len(referenceDF) and w2<t2:
+            # the right edge belongs to the next window
+            referenceDF=referenceDF[referenceDF.index<w2]
+        if len(referenceDF):
+            myDF=_cycleCorrelationWindow(reference, referenceDF, machines, w1, w2, tolerance, verbose)
+            profiling.count('cycles', len(myDF))
+            if profiling.enabled():
+                profiling.window({'function': 'iterCycleCorrelation', 't1': w1, 't2': w2,
+                                  'seconds': time.perf_counter()-start, 'cycles': len(myDF)})
+            yield myDF
+        if w2>=t2:
+            break
+        w1=w2
+
+def cycleCorrelation2pd(reference, listOfVariables, machines, t1, t2, fundamental='', tolerance=pd.Timedelta('20ms'),
+                        window=pd.Timedelta('1h'), verbose=False):
+    '''
+    cycleCorrelation2pd(reference, listOfVariables, machines, t1, t2, fundamental='', tolerance=pd.Timedelta('20ms'),
+                        window=pd.Timedelta('1h'), verbose=False)
+
+    Return the per-cycle pandas dataframe of iterCycleCorrelation for the full interval [t1, t2].
+
+    ===Example===
+    machines={'PSB': (['PSB.LSA:CYCLE','PSB.BCT%:INTENSITY'], -pd.offsets.Milli(635))}
+    myDF=importData.cycleCorrelation2pd('CPS', ['CPS.LSA:CYCLE'], machines, t1, t2, fundamental='%LHC25%')
+    myDF['PSB']
+    '''
+    myList=list(iterCycleCorrelation(reference, listOfVariables, machines, t1, t2, fundamental, tolerance,
+                                     window, verbose))
+    if len(myList)==0:
+        return pd.DataFrame()
+    return pd.concat(myList)
+
 def _UTClocalizeMe(x):
     '''
     Return the tz-aware datetime. In case of error returns x.
@@ -155,8 +714,86 @@ def _UTClocalizeMe(x):
     except:
          return x # in case NaT or None
 
-def LHCFillsByTime(t1,t2, verbose=False):
+# Cache of LHCFillsByTime: the completed fills {fillNumber: DATA} and the spans [t1, t2] (unix s) already covered
+# by the backend _fillsCacheBackend (the cache is reset when importData.cals is replaced)
+_fillsCache={}
+_fillsCoveredSpans=[]
+_fillsCacheBackend=None
+_fillsCacheLock=threading.Lock()
+
+def clearLHCFillsCache():
+    '''
+    Clear the cache of LHCFillsByTime (the completed fills and the time spans already queried).
+
+    The cache is also cleared when importData.cals is replaced by another backend.
+
+    ===Example===
+    importData.clearLHCFillsCache()
+    df=importData.LHCFillsByTime(t1,t2)  # fetched again from CALS
+    '''
+    global _fillsCacheBackend
+    with _fillsCacheLock:
+        _fillsCache.clear()
+        _fillsCoveredSpans[:]=[]
+        _fillsCacheBackend=None
+
+def _checkFillsCacheBackend(backend):
+    '''
+    Reset the cache of LHCFillsByTime if it was filled by another backend (to be called holding _fillsCacheLock).
+
+    This function is supposed to be private.
+    '''
+    global _fillsCacheBackend
+    if _fillsCacheBackend is not backend:
+        _fillsCache.clear()
+        _fillsCoveredSpans[:]=[]
+        _fillsCacheBackend=backend
+
+def _uncoveredSpans(t1, t2, spans):
+    '''
+    Return the list of (t1, t2) of the interval [t1, t2] not covered by the sorted and merged spans.
+
+    This function is supposed to be private.
+    '''
+    uncovered=[]
+    for start, end in spans:
+        if end<t1 or start>t2:
+            continue
+        if start>t1:
+            uncovered.append((t1, start))
+        t1=max(t1, end)
+    if t1<t2:
+        uncovered.append((t1, t2))
+    return uncovered
+
+def _LHCFillsTable(fills):
+    '''
+    Return the output of LHCFillsByTime from a list of DATA dictionaries of the fills (as in cals.getLHCFillsByTime).
+
+    This function is supposed to be private.
+    The columns are built with vectorized conversions (the missing end times, e.g. of the online fill, are NaT).
+    '''
+    if len(fills)==0:
+        return pd.DataFrame()
+
+    def toUTC(times):
+        return pd.to_datetime(np.array([np.nan if i is None else i for i in times], dtype=float), unit='s', utc=True)
+
+    modes=[(i['fillNumber'], j['mode'], j['startTime'], j['endTime']) for i in fills for j in i['beamModes']]
+    summary=[(i['fillNumber'], 'FILL', i['startTime'], i['endTime']) for i in fills]
+    # at the same start time the FILL row precedes its first mode
+    aux=summary+modes
+    out=pd.DataFrame({'mode': [i[1] for i in aux],
+                      'startTime': toUTC([i[2] for i in aux]),
+                      'endTime': toUTC([i[3] for i in aux])},
+                     index=[i[0] for i in aux], columns=['mode', 'startTime', 'endTime'])
+    out['duration']=out['endTime']-out['startTime']
+    return out.sort_values('startTime', kind='mergesort')
+
+def LHCFillsByTime(t1,t2, verbose=False, cache=True, chunk=pd.Timedelta(days=30), maxWorkers=4):
     '''
+    LHCFillsByTime(t1,t2, verbose=False, cache=True, chunk=pd.Timedelta(days=30), maxWorkers=4)
+
     Retrieve the LHC fills between t1 and t2.
 
     t1 and t2 are pandas datatime, therefore you can use tz-aware expression.
@@ -167,6 +804,12 @@ def LHCFillsByTime(t1,t2, verbose=False):
     If, at the moment of the CALS extraction, the fill is not yet dumped,
     the endTime of the fill is assigned to NaT (Not a Time).
 
+    Long intervals are queried in chunks of chunk, fetched concurrently by maxWorkers threads;
+    a fill across two chunks is kept once.
+    If cache is True, the completed fills and the time spans already queried are kept in memory,
+    so that only the spans never queried and the still-open fill are fetched again
+    (see clearLHCFillsCache, the cache is also cleared when importData.cals is replaced).
+
     ===Example===
 
     t1 = pd.Timestamp('2017-10-01')  # interpreted as tz='UTC'
@@ -177,49 +820,139 @@ def LHCFillsByTime(t1,t2, verbose=False):
     # This practice is not encouraged since 'UTC' time is monotonic along the year
     # (for the moment the leap seconds were always positive).
     summary['startTime']=summary['startTime'].apply(lambda x: x.astimezone('CET'))
+
+    # the second call is served by the cache
+    df=importData.LHCFillsByTime(pd.Timestamp('2016-01-01'), pd.Timestamp('2019-01-01'))
     '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    if t1.tz==None: t1=t1.tz_localize('UTC')
+    if t2.tz==None: t2=t2.tz_localize('UTC')
+    start, end=t1.value/1e9, t2.value/1e9
+    now=time.time()
+    backend=cals
+
+    if cache:
+        with _fillsCacheLock:
+            _checkFillsCacheBackend(backend)
+            spans=_uncoveredSpans(start, end, list(_fillsCoveredSpans))
+            cached=[i for i in _fillsCache.values() if i['startTime']<=end and i['endTime']>=start]
+    else:
+        spans=[(start, end)]
+        cached=[]
+
+    # The spans are split in chunks
+    chunks=[]
+    step=pd.Timedelta(chunk).value/1e9
+    for a, b in spans:
+        n=max(int(np.ceil((b-a)/step)), 1)
+        edges=np.linspace(a, b, n+1)
+        chunks=chunks+[(edges[i], edges[i+1]) for i in range(n)]
+
+    def fetch(span):
+        # pyTimber needs CET as internal variable
+        a, b=[pd.Timestamp(i, unit='s', tz='UTC').astimezone('CET') for i in span]
+        if verbose: print('Fetching the fills between ' + str(a) + ' and ' + str(b))
+        with profiling.stage('cals.getLHCFillsByTime'):
+            return backend.getLHCFillsByTime(a, b)
+
+    if maxWorkers>1 and len(chunks)>1:
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            results=list(executor.map(fetch, chunks))
+    else:
+        results=[fetch(i) for i in chunks]
+
+    # The chunks are stitched at the fill boundaries (a fill across two chunks is kept once)
+    fills={}
+    for i in [j for k in results for j in k]:
+        if i['fillNumber'] not in fills or i['endTime'] is not None:
+            fills[i['fillNumber']]=i
+    profiling.count('fills', len(fills))
+
+    if cache:
+        with _fillsCacheLock:
+            # the results are not cached if the backend was replaced in the meantime
+            if _fillsCacheBackend is backend:
+                for i in fills.values():
+                    if i['endTime'] is not None:
+                        _fillsCache[i['fillNumber']]=i
+                # a span is covered up to the still-open fill (to be refreshed) and up to now
+                for (a, b), result in zip(chunks, results):
+                    openFills=[i['startTime'] for i in result if i['endTime'] is None]
+                    b=min([b, now]+openFills)
+                    if a<b:
+                        _fillsCoveredSpans.append((a, b))
+                _fillsCoveredSpans[:]=_mergeWindows(_fillsCoveredSpans, 0)
+        for i in cached:
+            if i['fillNumber'] not in fills:
+                fills[i['fillNumber']]=i
+
+    if verbose and len(chunks)==0: print('Fills from the cache.')
+    return _LHCFillsTable(list(fills.values()))
+
+def _LHCFillData2pd(DATA):
+    '''
+    Return the summary and the beam modes (pd DataFrames) of the DATA dictionary of cals.getLHCFillData.
 
-    if t1.tz==None: t1.tz_localize('UTC')
-    else: t1=t1.astimezone('CET')
+    This function is supposed to be private.
+    '''
+    fillNumberList=[]
+    startTimeList=[]
+    endTimeList=[]
+    beamModesList=[]
+
+    # For each fill we parse the DATA dictionary
+    if DATA!=None:
+
+        for j in DATA['beamModes']:
+            beamModesList.append(j['mode'])
+            fillNumberList.append(DATA['fillNumber'])
+            startTimeList.append(j['startTime'])
+            endTimeList.append(j['endTime'])
+
+        auxDataFrame=pd.DataFrame()
+        auxDataFrame['mode']=pd.Series(beamModesList, fillNumberList)
+        auxDataFrame['startTime']=pd.Series(pd.to_datetime(startTimeList,unit='s'), fillNumberList)
+        auxDataFrame['endTime']=pd.Series(pd.to_datetime(endTimeList,unit='s'), fillNumberList)
+        auxDataFrame['duration']=auxDataFrame['endTime']-auxDataFrame['startTime']
+
+        aux=pd.DataFrame()
+        aux['startTime']=pd.Series(pd.to_datetime(DATA['startTime'],unit='s'), [DATA['fillNumber']])
+        if DATA['endTime']==None:
+            aux['endTime']=pd.Series(pd.to_datetime(endTimeList[-1],unit='s'), [DATA['fillNumber']])
+        else:
+            aux['endTime']=pd.Series(pd.to_datetime(DATA['endTime'],unit='s'), [DATA['fillNumber']])
+        try: 
+            aux['duration']=aux['endTime']-aux['startTime']
+        except:
+            aux['duration']=pd.to_datetime(endTimeList[-1],unit='s')
+    else:
+        aux, auxDataFrame=pd.DataFrame(),pd.DataFrame()
+    return aux, auxDataFrame
 
-    if t2.tz==None: t2.tz_localize('UTC')
-    else: t2=t2.astimezone('CET')
+def _LHCFillsConcat(fillsSummary, fillsDetails, verbose=False):
+    '''
+    Return the output of LHCFillsByNumber from the concatenated summaries and beam modes of the fills.
 
-    DATA=cals.getLHCFillsByTime(t1,t2)
+    This function is supposed to be private.
+    '''
+    aux=pd.DataFrame()
 
-    fillNumberList, beamModesList = [], []
-    startTimeList, endTimeList = [], []
-    FN, ST, ET =[], [], [] #fillNumber, startTime, endTime
+    # The timestamps are localized and the dataframes are sorted
+    if len(fillsSummary):
+        fillsSummary['startTime']=fillsSummary['startTime'].apply(_UTClocalizeMe)
+        fillsSummary['endTime']=fillsSummary['endTime'].apply(_UTClocalizeMe)
+        fillsSummary=fillsSummary.sort_values(['startTime'])
 
-    for i in DATA:
-        FN.append(i['fillNumber']); ST.append(i['startTime']); ET.append(i['endTime'])
-        for j in i['beamModes']:
-            fillNumberList.append(i['fillNumber']); beamModesList.append(j['mode'])
-            startTimeList.append(j['startTime']); endTimeList.append(j['endTime'])
+        fillsDetails['startTime']=fillsDetails['startTime'].apply(_UTClocalizeMe)
+        fillsDetails['endTime']=fillsDetails['endTime'].apply(_UTClocalizeMe)
 
-    auxDataFrame=pd.DataFrame()
-    auxDataFrame['mode']=pd.Series(beamModesList, fillNumberList)
-    auxDataFrame['startTime']=pd.Series(pd.to_datetime(startTimeList,unit='s'), fillNumberList)
-    auxDataFrame['endTime']=pd.Series(pd.to_datetime(endTimeList,unit='s'), fillNumberList)
-    auxDataFrame['duration']=auxDataFrame['endTime']-auxDataFrame['startTime']
+        fillsDetails=fillsDetails.sort_values(['startTime'])
 
-    aux=pd.DataFrame()
-    aux['startTime']=pd.Series(pd.to_datetime(ST,unit='s'), FN)
-    aux['endTime']=pd.Series(pd.to_datetime(ET,unit='s'), FN)
-    aux['duration']=aux['endTime']-aux['startTime']
-
- 
-    aux['startTime']=aux['startTime'].apply(_UTClocalizeMe)
-    aux['endTime']=aux['endTime'].apply(_UTClocalizeMe)
-
-    auxDataFrame['startTime']=auxDataFrame['startTime'].apply(_UTClocalizeMe)
-    auxDataFrame['endTime']=auxDataFrame['endTime'].apply(_UTClocalizeMe)
-    aux['mode']='FILL'
-    fillsSummary=aux;
-    fillsDetails=auxDataFrame;
-    out=pd.DataFrame()
+    fillsSummary['mode']='FILL'
+    
     if len(fillsSummary)>0:
-        if (len(fillsSummary)==1) & (str(fillsSummary.iloc[0]['duration'])=='NaT'):
+        if (len(fillsSummary)==1) & (fillsSummary.iloc[0]['duration']==None):
             # If there is only the online FILL (so not yet completed)
             # TODO: very cumbersome casting (first to string, then concatenation, then to timestamp)
             # I am no satisfied [GS]
@@ -228,15 +961,14 @@ def LHCFillsByTime(t1,t2, verbose=False):
             fillsSummary['duration']='NaT'
             fillsDetails['endTime']=fillsDetails['endTime'].astype(str)
             fillsDetails['duration']=fillsDetails['duration'].astype(str)
-            out=pd.concat([fillsDetails,fillsSummary])
-            out=out.sort_values('startTime')[['mode','startTime','endTime','duration']]
-            out['endTime']=out['endTime'].apply(pd.Timestamp)
-            out['duration']=out['endTime']-out['startTime']
+            aux=pd.concat([fillsDetails,fillsSummary])
+            aux=aux.sort_values('startTime')[['mode','startTime','endTime','duration']]
+            aux['endTime']=aux['endTime'].apply(pd.Timestamp)
+            aux['duration']=aux['endTime']-aux['startTime']
         else:
-            out=pd.concat([fillsDetails,fillsSummary])
-            out=out.sort_values('startTime')[['mode','startTime','endTime','duration']]    
-    
-    return out
+            aux=pd.concat([fillsDetails,fillsSummary])
+            aux=aux.sort_values('startTime')[['mode','startTime','endTime','duration']]    
+    return aux
 
 def LHCFillsByNumber(fillList, verbose=False):
     '''
@@ -247,7 +979,7 @@ def LHCFillsByNumber(fillList, verbose=False):
     ===Example===
     df=importData.LHCFillsByNumber([6400, 5900, 5901])
     '''
-    fillsSummary, fillsDetails, aux=pd.DataFrame(),pd.DataFrame(),pd.DataFrame()
+    fillsSummary, fillsDetails=pd.DataFrame(),pd.DataFrame()
     
     # we dilter with unique
     fillList=np.unique(fillList)
@@ -257,76 +989,282 @@ def LHCFillsByNumber(fillList, verbose=False):
 
         if verbose: print('Fill ' + str(i))
 
-        DATA=cals.getLHCFillData(i)
+        with profiling.stage('cals.getLHCFillData'):
+            DATA=cals.getLHCFillData(i)
+        profiling.count('fills')
+
+        aux, auxDataFrame=_LHCFillData2pd(DATA)
+
+        # We concatenate the results
+        fillsSummary=pd.concat([aux,fillsSummary])
+        fillsDetails=pd.concat([auxDataFrame,fillsDetails])
 
-        fillNumberList=[]
-        startTimeList=[]
-        endTimeList=[]
-        beamModesList=[]
+    return _LHCFillsConcat(fillsSummary, fillsDetails, verbose)
 
-        # For each fill we parse the DATA dictionary
-        if DATA!=None:
+async def aLHCFillsByNumber(fillList, verbose=False, maxConcurrent=4, timeout=None):
+    '''
+    aLHCFillsByNumber(fillList, verbose=False, maxConcurrent=4, timeout=None)
 
-            for j in DATA['beamModes']:
-                beamModesList.append(j['mode'])
-                fillNumberList.append(DATA['fillNumber'])
-                startTimeList.append(j['startTime'])
-                endTimeList.append(j['endTime'])
+    Coroutine version of LHCFillsByNumber.
 
-            auxDataFrame=pd.DataFrame()
-            auxDataFrame['mode']=pd.Series(beamModesList, fillNumberList)
-            auxDataFrame['startTime']=pd.Series(pd.to_datetime(startTimeList,unit='s'), fillNumberList)
-            auxDataFrame['endTime']=pd.Series(pd.to_datetime(endTimeList,unit='s'), fillNumberList)
-            auxDataFrame['duration']=auxDataFrame['endTime']-auxDataFrame['startTime']
+    The fills are retrieved concurrently (at most maxConcurrent at the same time)
+    and each fill has to be retrieved within timeout seconds (asyncio.TimeoutError otherwise).
 
-            aux=pd.DataFrame()
-            aux['startTime']=pd.Series(pd.to_datetime(DATA['startTime'],unit='s'), [DATA['fillNumber']])
-            if DATA['endTime']==None:
-                aux['endTime']=pd.Series(pd.to_datetime(endTimeList[-1],unit='s'), [DATA['fillNumber']])
-            else:
-                aux['endTime']=pd.Series(pd.to_datetime(DATA['endTime'],unit='s'), [DATA['fillNumber']])
-            try: 
-                aux['duration']=aux['endTime']-aux['startTime']
-            except:
-                aux['duration']=pd.to_datetime(endTimeList[-1],unit='s')
-        else:
-            aux, auxDataFrame=pd.DataFrame(),pd.DataFrame()
+    ===Example===
+    df = await importData.aLHCFillsByNumber([6400, 5900, 5901], timeout=10)
+    '''
+    import asyncio
 
-        # We concatenate the results
+    fillList=np.unique(fillList)
+    semaphore=asyncio.Semaphore(maxConcurrent)
+
+    async def fetch(i):
+        async with semaphore:
+            if verbose: print('Fill ' + str(i))
+            DATA=await _inExecutor(cals.getLHCFillData, i, timeout=timeout)
+            profiling.count('fills')
+            return _LHCFillData2pd(DATA)
+
+    myList=await asyncio.gather(*[fetch(i) for i in fillList])
+    fillsSummary, fillsDetails=pd.DataFrame(),pd.DataFrame()
+    # same order of the concatenation of LHCFillsByNumber
+    for aux, auxDataFrame in myList:
         fillsSummary=pd.concat([aux,fillsSummary])
         fillsDetails=pd.concat([auxDataFrame,fillsDetails])
+    return _LHCFillsConcat(fillsSummary, fillsDetails, verbose)
 
-    # The timestamps are localized and the dataframes are sorted
-    if len(fillsSummary):
-        fillsSummary['startTime']=fillsSummary['startTime'].apply(_UTClocalizeMe)
-        fillsSummary['endTime']=fillsSummary['endTime'].apply(_UTClocalizeMe)
-        fillsSummary=fillsSummary.sort_values(['startTime'])
+def _mergeWindows(windows, maxGap=pd.Timedelta(0)):
+    '''
+    Return the list of (t1, t2) obtained merging the overlapping or adjacent windows.
 
-        fillsDetails['startTime']=fillsDetails['startTime'].apply(_UTClocalizeMe)
-        fillsDetails['endTime']=fillsDetails['endTime'].apply(_UTClocalizeMe)
+    windows is a list of (t1, t2). Two windows are merged if the gap between them is not larger than maxGap.
+    '''
+    merged=[]
+    for t1, t2 in sorted(windows):
+        if len(merged) and t1<=merged[-1][1]+maxGap:
+            merged[-1]=(merged[-1][0], max(merged[-1][1], t2))
+        else:
+            merged.append((t1, t2))
+    return merged
 
-        fillsDetails=fillsDetails.sort_values(['startTime'])
+def LHCFills2pd(listOfVariables, fillList, modes=['STABLE'], fundamental='', maxGap=pd.Timedelta(0),
+                maxWorkers=4, cacheDir=None, verbose=False):
+    '''
+    LHCFills2pd(listOfVariables, fillList, modes=['STABLE'], fundamental='', maxGap=pd.Timedelta(0),
+                maxWorkers=4, cacheDir=None, verbose=False)
 
-    fillsSummary['mode']='FILL'
-    
-    if len(fillsSummary)>0:
-        if (len(fillsSummary)==1) & (fillsSummary.iloc[0]['duration']==None):
-            # If there is only the online FILL (so not yet completed)
-            # TODO: very cumbersome casting (first to string, then concatenation, then to timestamp)
-            # I am no satisfied [GS]
-            if verbose: print('Online FILL...')
-            fillsSummary['endTime']='NaT'
-            fillsSummary['duration']='NaT'
-            fillsDetails['endTime']=fillsDetails['endTime'].astype(str)
-            fillsDetails['duration']=fillsDetails['duration'].astype(str)
-            aux=pd.concat([fillsDetails,fillsSummary])
-            aux=aux.sort_values('startTime')[['mode','startTime','endTime','duration']]
-            aux['endTime']=aux['endTime'].apply(pd.Timestamp)
-            aux['duration']=aux['endTime']-aux['startTime']
+    Return the listOfVariables during the beam modes of the fills in fillList.
+
+    The time windows are derived from LHCFillsByNumber ('FILL' can be used as mode to get the full fill).
+    Overlapping or adjacent windows (gap not larger than maxGap) are merged and fetched once,
+    the merged windows are fetched concurrently with maxWorkers threads.
+    The output is a pandas dataframe with a (fill, mode, time) MultiIndex, the times are UTC-localized.
+    A sample at the boundary of two consecutive modes belongs to both.
+
+    If cacheDir is specified, each fetched window is stored there (pickle) and it is not fetched again
+    in the following calls: an interrupted extraction can be resumed calling again the function.
+    The file names contain a hash of the variables and of fundamental, so that a call with different variables
+    does not read the windows of another extraction.
+
+    ===Example===
+    df=importData.LHCFills2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], [6400, 6401, 6402], modes=['RAMP','STABLE'],
+                              cacheDir='/tmp/myExtraction')
+    df.loc[6400,'STABLE']
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    listOfVariables=_smartList(listOfVariables)
+    fills=LHCFillsByNumber(fillList, verbose=verbose)
+    if len(fills)==0:
+        return pd.DataFrame()
+    fills=fills[fills['mode'].isin(modes)]
+
+    # The modes not yet ended (online fill) are extracted up to now
+    now=pd.Timestamp.now(tz='UTC')
+    windows=[(fill, row['mode'], row['startTime'], row['endTime'] if not pd.isnull(row['endTime']) else now)
+             for fill, row in fills.iterrows()]
+    mergedWindows=_mergeWindows([(i[2], i[3]) for i in windows], maxGap)
+    if verbose: print(str(len(windows)) + ' windows merged in ' + str(len(mergedWindows)) + '.')
+
+    if cacheDir is not None and not os.path.exists(cacheDir):
+        os.makedirs(cacheDir)
+    if cacheDir is not None:
+        import hashlib
+        extraction=hashlib.sha1(repr((sorted(listOfVariables), fundamental)).encode()).hexdigest()[:16]
+
+    def fetch(window):
+        t1, t2=window
+        if cacheDir is not None:
+            myFile=os.path.join(cacheDir, 'window_' + extraction + '_' + str(t1.value) + '_' + str(t2.value) + '.pkl')
+            if os.path.exists(myFile):
+                if verbose: print('Window ' + str(t1) + ' - ' + str(t2) + ' already fetched.')
+                return pd.read_pickle(myFile)
+        if verbose: print('Fetching window ' + str(t1) + ' - ' + str(t2))
+        aux=_noSplitcals2pd(listOfVariables, t1, t2, fundamental)
+        if cacheDir is not None:
+            # the window is stored only when complete
+            aux.to_pickle(myFile + '.tmp')
+            os.replace(myFile + '.tmp', myFile)
+        return aux
+
+    if maxWorkers>1:
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            mergedData=list(executor.map(fetch, mergedWindows))
+    else:
+        mergedData=[fetch(i) for i in mergedWindows]
+
+    # Each window is sliced from the merged window containing it
+    starts=[i[0] for i in mergedWindows]
+    myList=[]
+    for fill, mode, t1, t2 in windows:
+        aux=mergedData[np.searchsorted(starts, t1, side='right')-1]
+        if len(aux)==0:
+            continue
+        aux=aux[(aux.index>=t1) & (aux.index<=t2)]
+        aux.index=pd.MultiIndex.from_arrays([[fill]*len(aux), [mode]*len(aux), aux.index],
+                                            names=['fill', 'mode', 'time'])
+        myList.append(aux)
+    if len(myList)==0:
+        return pd.DataFrame()
+    return pd.concat(myList).sort_index(axis=1)
+
+class CalsPoller:
+    '''
+    Incremental ("tail") extraction of CALS variables for live monitoring.
+
+    The poller remembers the last timestamp received for each variable and, at each poll(),
+    it fetches only the new samples and appends them to a per-variable buffer.
+    Each poll starts from the end of the previous one minus overlap, so that the samples logged late
+    are received too; the samples already received are dropped using the per-variable last timestamps.
+    The buffers are bounded in time (retention) and, optionally, in number of samples per variable (maxSamples):
+    they are trimmed by position, so that the cost of a poll does not depend on the retention.
+    The wide dataframe of the buffers (self.data) is built only when accessed, its index timestamps
+    are UTC-localized and its columns sorted, as for cals2pd.
+
+    The '%' search pattern is resolved once, at the creation of the poller.
+
+    ===Example===
+    poller=importData.CalsPoller(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], retention=pd.Timedelta('2h'))
+    newData=poller.poll()       # to be called at each refresh of the dashboard
+    newModes=poller.pollModes() # beam modes of the online fill that changed since the previous call
+    poller.data                 # all the samples within the retention
+    '''
+
+    def __init__(self, listOfVariables, retention=pd.Timedelta('1h'), maxSamples=None,
+                 fundamental='', modesLookback=pd.Timedelta(days=2), overlap=pd.Timedelta('10s'), verbose=False):
+        self.variables=_smartList(listOfVariables)
+        self.retention=retention
+        self.maxSamples=maxSamples
+        self.fundamental=fundamental
+        self.modesLookback=modesLookback
+        self.overlap=overlap
+        self.verbose=verbose
+        self.lastTimestamps=dict((i, None) for i in self.variables)
+        self.lastPoll=None
+        # per-variable list of the (times, values) chunks received, the wide view is cached until the next poll
+        self._buffers=dict((i, []) for i in self.variables)
+        self._data=None
+        self.fillNumber=None
+        self.modes=pd.DataFrame()
+
+    @property
+    def data(self):
+        '''
+        The samples within the retention (pandas dataframe, built at the first access after a poll).
+        '''
+        if self._data is None:
+            runs={}
+            for i in self._buffers:
+                if len(self._buffers[i]):
+                    runs[i]=(np.concatenate([j[0] for j in self._buffers[i]]),
+                             _concatValues([j[1] for j in self._buffers[i]]))
+            self._data=SparseFrame(runs).toDataFrame()
+        return self._data
+
+    def _trim(self, name, oldest):
+        '''
+        Drop the samples of the buffer of the variable name older than oldest (ns) or exceeding maxSamples.
+        '''
+        chunks=self._buffers[name]
+        while len(chunks) and (len(chunks[0][0])==0 or chunks[0][0][-1]<oldest):
+            chunks.pop(0)
+        if len(chunks):
+            start=np.searchsorted(chunks[0][0], oldest, side='left')
+            chunks[0]=(chunks[0][0][start:], chunks[0][1][start:])
+        if self.maxSamples is not None:
+            excess=sum([len(i[0]) for i in chunks])-self.maxSamples
+            while excess>0:
+                if len(chunks[0][0])<=excess:
+                    excess-=len(chunks[0][0])
+                    chunks.pop(0)
+                else:
+                    chunks[0]=(chunks[0][0][excess:], chunks[0][1][excess:])
+                    excess=0
+
+    def poll(self, t2=None):
+        '''
+        Fetch the samples received after the last poll and return them as a pandas dataframe.
+
+        t2 is the end of the extraction (by default now). The first poll fetches the full retention.
+        '''
+        if t2 is None:
+            t2=pd.Timestamp.now(tz='UTC')
+        elif t2.tz==None:
+            t2=t2.tz_localize('UTC')
+        oldest=t2-self.retention
+
+        # We restart from the end of the previous poll (minus overlap), without going before the retention
+        if self.lastPoll is None:
+            t1=oldest
         else:
-            aux=pd.concat([fillsDetails,fillsSummary])
-            aux=aux.sort_values('startTime')[['mode','startTime','endTime','duration']]    
-    return aux
+            t1=max(self.lastPoll-self.overlap, oldest)
+        if self.verbose: print('Polling from ' + str(t1) + ' to ' + str(t2))
+
+        listOfVariableToAdd, DATA=_calsGet(self.variables, t1, t2, self.fundamental, self.verbose)
+        self.lastPoll=t2
+
+        # We drop the samples already received (t1 is included in the CALS extraction)
+        newRuns={}
+        for i, (times, values) in SparseFrame.fromCals(DATA).runs.items():
+            if self.lastTimestamps.get(i) is not None:
+                start=np.searchsorted(times, self.lastTimestamps[i].value, side='right')
+                times, values=times[start:], values[start:]
+            if len(times)==0:
+                continue
+            newRuns[i]=(times, values)
+            self.lastTimestamps[i]=pd.Timestamp(times[-1], tz='UTC')
+            self._buffers.setdefault(i, []).append((times, values))
+
+        # Bounded retention
+        for i in self._buffers:
+            self._trim(i, oldest.value)
+        self._data=None
+        return SparseFrame(newRuns).toDataFrame()
+
+    def pollModes(self, t2=None):
+        '''
+        Return the beam modes of the last LHC fill that started or ended since the previous call.
+
+        The output has the same format of LHCFillsByTime. If the fill is not yet dumped,
+        the endTime of the fill is NaT. At the first call all the modes of the last fill are returned.
+        '''
+        if t2 is None:
+            t2=pd.Timestamp.now(tz='UTC')
+        fills=LHCFillsByTime(t2-self.modesLookback, t2, verbose=self.verbose)
+        if len(fills)==0:
+            return pd.DataFrame()
+
+        fillNumber=fills.index.max()
+        modes=fills.loc[[fillNumber]]
+        if fillNumber!=self.fillNumber:
+            if self.verbose: print('New fill: ' + str(fillNumber))
+            changed=modes
+        else:
+            previous=set(zip(self.modes['mode'], self.modes['startTime'], self.modes['endTime'].astype(str)))
+            changed=modes[[i not in previous for i in zip(modes['mode'], modes['startTime'], modes['endTime'].astype(str))]]
+        self.fillNumber=fillNumber
+        self.modes=modes
+        return changed
 
 
 def massiFile2pd(myFileName, myUnzipPath='/tmp'):
@@ -343,8 +1281,10 @@ def massiFile2pd(myFileName, myUnzipPath='/tmp'):
     import os
     import glob
 
-    tar = tarfile.open(myFileName, "r:gz")
-    tar.extractall(path=myUnzipPath)
+    profiling.count('bytes', os.path.getsize(myFileName))
+    with profiling.stage('massi.extract'):
+        tar = tarfile.open(myFileName, "r:gz")
+        tar.extractall(path=myUnzipPath)
     filename,extension=os.path.splitext(myFileName)
     fillNumber=tar.getnames()[0]
     pdList=[]
@@ -357,23 +1297,26 @@ def massiFile2pd(myFileName, myUnzipPath='/tmp'):
             bunch=int(aux[2])/10
             if MassiFileType=='lumi':
                 experiment=aux[3]
-                myDF=pd.read_csv(i,sep=' ', header=0,names=['UNIX time UTC',
-                                                              'Stable Beam Flag',
-                                                              'Luminosity [Hz/ub]',
-                                                              'P2P luminosity error [Hz/ub]',
-                                                              'Specific luminosity [Hz/ub]',
-                                                              'P2P specific luminosity [Hz/ub]'])
-                myDF['Bunch']=int(bunch)
-                myDF['FILL']=int(fillNumber)
-                myDF['Experiment']=experiment
-                myDF['Timestamp']=myDF['UNIX time UTC'].apply(lambda x: pd.Timestamp(x,unit='s').tz_localize('UTC'))
+                with profiling.stage('massi.parse'):
+                    myDF=pd.read_csv(i,sep=' ', header=0,names=['UNIX time UTC',
+                                                                  'Stable Beam Flag',
+                                                                  'Luminosity [Hz/ub]',
+                                                                  'P2P luminosity error [Hz/ub]',
+                                                                  'Specific luminosity [Hz/ub]',
+                                                                  'P2P specific luminosity [Hz/ub]'])
+                    myDF['Bunch']=int(bunch)
+                    myDF['FILL']=int(fillNumber)
+                    myDF['Experiment']=experiment
+                    myDF['Timestamp']=myDF['UNIX time UTC'].apply(lambda x: pd.Timestamp(x,unit='s').tz_localize('UTC'))
                 pdList.append(myDF)
+                profiling.count('files')
             else:
                 print('Only lumi file implemented.')
         os.remove(i)
-    massiFile=pd.concat(pdList)
-    massiFile=massiFile.set_index('Timestamp')
-    del massiFile.index.name
+    with profiling.stage('massi.concat'):
+        massiFile=pd.concat(pdList)
+        massiFile=massiFile.set_index('Timestamp')
+    massiFile.index.name=None
     os.rmdir(os.path.join(myUnzipPath,fillNumber))
     return massiFile[['FILL','Stable Beam Flag','Experiment','Bunch','Luminosity [Hz/ub]','P2P luminosity error [Hz/ub]',
               'Specific luminosity [Hz/ub]','P2P specific luminosity [Hz/ub]']]
@@ -385,59 +1328,103 @@ def calsCSV2pd(myFile):
     The files are of the type in /eos/project/l/lhc-lumimod/
     UTC time is always assumed.
     '''
-    # I read the full file once to have the line numbers when a new variable starts, its name and its type
-    startLinesList = []
-    variableNameList = []
-    variableTypeList=[]
-    with open(myFile, 'r') as file:
-        lines=file.readlines()
-        i=0
-        for i in range(len(lines)):
-            if lines[i][0:8]=='VARIABLE':
-                variableName=lines[i].split(': ')[1][0:-1]
-                startLinesList.append(i)
-                variableNameList.append(variableName)            
-
-            if lines[i][0:9]=='Timestamp':
-                variableName=lines[i].split(',')[1][0:-1]
-                variableTypeList.append(variableName)
-
-        startLinesList.append(i+1)
-
-    # in the second part I fill for each variable a pd DataFrame and I merge the dataframes.
-    # for the moment I assume that only two variable type are used ('Value' and 'Array Values')
-    # TODO: relax the assumptions above.
-    aux=pd.DataFrame()
-    for i in range(len(startLinesList)-1):
-        if variableTypeList[i]=='Value':
-            # in this case I use the pd.read_csv
-            df=pd.read_csv(myFile,skiprows=startLinesList[i]+1, nrows=startLinesList[i+1]-3-startLinesList[i],)
-            df=df.set_index('Timestamp (UTC_TIME)')
-            df=df.rename(index=str, columns={'Value': variableNameList[i] })
-            df.index=pd.DatetimeIndex(df.index)
-        if variableTypeList[i]=='Array Values':
-            # in this case I use a custom solution
-            j=startLinesList[i]+3
-            myTime=[]
-            myArray=[]
-            while j<(startLinesList[i+1]):    
-                myReading=lines[j].split(',')
-                myTime.append(myReading[0])
-                myArray.append(np.double(myReading[1:]))
-                j=j+1
-            df=pd.DataFrame({'Array Values':myArray,'Timestamp (UTC_TIME)':myTime})
-            df=df.set_index('Timestamp (UTC_TIME)')
-            df=df.rename(index=str, columns={'Array Values': variableNameList[i] })     
-            df.index=pd.DatetimeIndex(df.index)
-        # I merge to maintain the index unique
-        aux=pd.merge(aux,df, left_index=True, 
-                         right_index=True, 
-                         how='outer')
+    dfList=_calsCSVVariables(myFile)
+    with profiling.stage('csv.merge'):
+        if len(dfList) and all([i.index.is_unique for i in dfList]):
+            # a single outer join of all the variables
+            aux=pd.concat(dfList, axis=1)
+        else:
+            aux=pd.DataFrame()
+            for df in dfList:
+                # I merge to maintain the index unique
+                aux=pd.merge(aux,df, left_index=True, 
+                                 right_index=True, 
+                                 how='outer')
     aux.index=aux.index.tz_localize('UTC')
     aux=aux.sort_index()
-    del aux.index.name
+    aux.index.name=None
     return aux 
 
+def calsCSVs2pd(myFiles, processes=None, timings=False, verbose=False):
+    '''
+    calsCSVs2pd(myFiles, processes=None, timings=False, verbose=False)
+
+    Convert many cals CVS files (a folder, a glob pattern or a list of files) in a single pd DataFrame.
+
+    The files are parsed in parallel by a pool of processes (processes=None to use all the cores).
+    The workers return the parsed variables as Arrow IPC files that are memory-mapped by the main process
+    (no pickling of DataFrames), the samples of each variable are then joined in a single union pass
+    (at the same timestamp the sample of the first file in alphabetical order wins).
+    The parsing time of each file is reported to cl2pd.profiling and, if timings is True,
+    it is also returned as a second output (pd DataFrame with the columns 'seconds' and 'variables').
+
+    UTC time is always assumed. pyarrow is needed.
+
+    ===Example===
+    aux=importData.calsCSVs2pd('/eos/project/l/lhc-lumimod/LuminosityFollowUp/2018/rawdata/*.csv')
+    aux, timings=importData.calsCSVs2pd('/eos/project/l/lhc-lumimod/LuminosityFollowUp/2018/rawdata/', timings=True)
+    '''
+    import glob
+    import multiprocessing
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    import pyarrow as pa
+    from .exportData import _arrowToValues
+
+    if isinstance(myFiles, str):
+        if os.path.isdir(myFiles):
+            myFiles=glob.glob(os.path.join(myFiles, '*.csv'))
+        else:
+            myFiles=glob.glob(myFiles)
+    myFiles=sorted(set(myFiles))
+
+    outputFolder=tempfile.mkdtemp(prefix='calsCSVs2pd')
+    timingList=[]
+    variables={}
+    try:
+        arguments=[(myFile, outputFolder, i) for i, myFile in enumerate(myFiles)]
+        # the workers are not forked from this process (that runs the JVM of pytimber)
+        # and they import only cl2pd.calsCSV
+        context=multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            results=list(executor.map(_calsCSV2ipc, arguments))
+
+        for myFile, output, seconds in results:
+            if verbose: print(myFile + ' parsed in ' + str(seconds) + ' s')
+            profiling.window({'function': 'calsCSVs2pd', 'file': myFile, 'seconds': seconds, 'variables': len(output)})
+            timingList.append([myFile, seconds, len(output)])
+            for name, ipcFile, kind in output:
+                with pa.memory_map(ipcFile, 'r') as source:
+                    table=pa.ipc.open_file(source).read_all()
+                    aux=variables.setdefault(name, [kind, [], []])
+                    # views of the memory-mapped buffers, copied once by the union below
+                    aux[1].append(table.column('time').combine_chunks().to_numpy())
+                    if kind=='vector':
+                        aux[2].append(_arrowToValues(table.column('value'), 'vector'))
+                    else:
+                        aux[2].append(table.column('value').combine_chunks().to_numpy(zero_copy_only=False))
+    finally:
+        shutil.rmtree(outputFolder, ignore_errors=True)
+
+    # union of the files: one series per variable, then a single outer join
+    with profiling.stage('csv.union'):
+        seriesList=[]
+        for name in sorted(variables):
+            kind, timesList, valuesList=variables[name]
+            times=np.concatenate(timesList)
+            values=np.concatenate(valuesList)
+            order=np.argsort(times, kind='mergesort')
+            times, values=times[order], values[order]
+            keep=np.append(True, times[1:]!=times[:-1])
+            index=pd.DatetimeIndex(times[keep].astype('datetime64[ns]')).tz_localize('UTC')
+            seriesList.append(pd.Series(values[keep], index=index, name=name))
+        aux=pd.concat(seriesList, axis=1).sort_index() if len(seriesList) else pd.DataFrame()
+
+    if timings:
+        return aux, pd.DataFrame(timingList, columns=['file', 'seconds', 'variables']).set_index('file')
+    return aux
+
 def mat2dict(myfile):
     '''
     Import a matlab file in a python structure 
@@ -468,7 +1455,9 @@ def mat2pd(variablesList,filesList, verbose=False, matlabFullInfo=False):
     for i in filesList:
         if verbose:
             print(i)
-        data=mat2dict(i);
+        with profiling.stage('mat.load'):
+            data=mat2dict(i);
+        profiling.count('files')
         if matlabFullInfo:
             matlabObject.append(data)
         localCycleStamp=np.max(data.headerCycleStamps);
@@ -559,7 +1548,9 @@ def _tfs2pd(myFile):
         ===Example=== 
         aux=TFS2pd('/eos/user/s/sterbini/MD_ANALYSIS/2018/LHC MD Optics/collisionAt25cm_180urad/lhcb1_thick.survey')
         '''
-        a=_TFS(myFile);
+        with profiling.stage('tfs.parse'):
+            a=_TFS(myFile);
+        profiling.count('files')
         aux=[]
         aux1=[]
 
@@ -170,3 +170,129 @@ def setMagneticRigidity_Tm(magneticRigidity_Tm, restEnergy_GeV=restEnergyProton_
                 'magneticRigidity_Tm':magneticRigidity_Tm}
     else:
          print('Error: elementaryCharge and magneticRigidity_Tm are equal to 0, so the problem cannot be inverted.')  
+
+class Species:
+    """
+    A particle species (rest energy and charge) with precomputed constants and vectorized conversions.
+
+    The quantities are the keys of the set* functions: 'totalEnergy_GeV', 'kinetikEnergy_GeV', 'pc_GeV',
+    'magneticRigidity_Tm', 'relativisticBeta', 'relativisticGamma' and 'relativisticBetaGamma'.
+    The conversions accept scalars or numpy arrays and they do not check the physical range of the input.
+
+    ===Example===
+    proton=particle.Species()
+    lead=particle.Species(restEnergy_GeV=193.687, elementaryCharge=82., name='Pb82+')
+    gamma=proton.convert(energy_GeV, 'totalEnergy_GeV', 'relativisticGamma')
+    f_rev=proton.revolutionFrequency_Hz(energy_GeV, 'totalEnergy_GeV', circumference_m=26658.8832)
+    # linear interpolation on a precomputed table (for very large arrays)
+    energy2beta=proton.lookupTable('totalEnergy_GeV', 'relativisticBeta', 450., 7000.)
+    beta=energy2beta(energy_GeV)
+    """
+    quantities=['totalEnergy_GeV', 'kinetikEnergy_GeV', 'pc_GeV', 'magneticRigidity_Tm',
+                'relativisticBeta', 'relativisticGamma', 'relativisticBetaGamma']
+
+    def __init__(self, restEnergy_GeV=restEnergyProton_GeV, elementaryCharge=elementaryChargeProton, name='proton'):
+        if restEnergy_GeV<=0:
+            raise ValueError('restEnergy_GeV should be greater than 0.')
+        self.name=name
+        self.restEnergy_GeV=restEnergy_GeV
+        self.elementaryCharge=abs(elementaryCharge)
+        # precomputed constants
+        self.restEnergySquared_GeV2=restEnergy_GeV**2
+        if self.elementaryCharge==0:
+            self.pcToMagneticRigidity=np.nan
+        else:
+            self.pcToMagneticRigidity=1.E9/speedOfLight_m_s/self.elementaryCharge
+
+    def __repr__(self):
+        return 'Species(name=%r, restEnergy_GeV=%r, elementaryCharge=%r)' % (self.name, self.restEnergy_GeV, self.elementaryCharge)
+
+    def _checkQuantity(self, quantity):
+        if quantity not in self.quantities:
+            raise ValueError('Unknown quantity ' + str(quantity) + ', it should be one of ' + str(self.quantities) + '.')
+
+    def _toPc(self, values, quantity):
+        m=self.restEnergy_GeV
+        if quantity=='pc_GeV':
+            return values
+        if quantity=='totalEnergy_GeV':
+            return np.sqrt(values**2-self.restEnergySquared_GeV2)
+        if quantity=='kinetikEnergy_GeV':
+            return np.sqrt(values*(values+2.*m))
+        if quantity=='magneticRigidity_Tm':
+            return values/self.pcToMagneticRigidity
+        if quantity=='relativisticBeta':
+            return m*values/np.sqrt(1.-values**2)
+        if quantity=='relativisticGamma':
+            return m*np.sqrt(values**2-1.)
+        if quantity=='relativisticBetaGamma':
+            return m*values
+
+    def _fromPc(self, pc, quantity):
+        m=self.restEnergy_GeV
+        if quantity=='pc_GeV':
+            return pc
+        if quantity=='totalEnergy_GeV':
+            return np.hypot(pc, m)
+        if quantity=='kinetikEnergy_GeV':
+            # written to avoid the cancellation of E-m at low energy
+            return pc**2/(np.hypot(pc, m)+m)
+        if quantity=='magneticRigidity_Tm':
+            return pc*self.pcToMagneticRigidity
+        if quantity=='relativisticBeta':
+            return pc/np.hypot(pc, m)
+        if quantity=='relativisticGamma':
+            return np.hypot(pc, m)/m
+        if quantity=='relativisticBetaGamma':
+            return pc/m
+
+    def convert(self, values, fromQuantity, toQuantity):
+        """
+        Convert values (scalar or array) from fromQuantity to toQuantity.
+        """
+        self._checkQuantity(fromQuantity)
+        self._checkQuantity(toQuantity)
+        values=np.asarray(values, dtype=float)
+        if fromQuantity==toQuantity:
+            return values
+        m=self.restEnergy_GeV
+        # direct kernels for the most common pairs (no intermediate arrays for pc)
+        if fromQuantity=='totalEnergy_GeV' and toQuantity=='relativisticGamma':
+            return values/m
+        if fromQuantity=='relativisticGamma' and toQuantity=='totalEnergy_GeV':
+            return values*m
+        if fromQuantity=='relativisticGamma' and toQuantity=='relativisticBeta':
+            return np.sqrt(1.-values**-2)
+        if fromQuantity=='totalEnergy_GeV' and toQuantity=='relativisticBeta':
+            return np.sqrt(1.-(m/values)**2)
+        return self._fromPc(self._toPc(values, fromQuantity), toQuantity)
+
+    def kinematics(self, values, quantity):
+        """
+        Return a dictionary with all the quantities (as the set* functions) computed from values of quantity.
+        """
+        self._checkQuantity(quantity)
+        pc=self._toPc(np.asarray(values, dtype=float), quantity)
+        out=dict((i, self._fromPc(pc, i)) for i in self.quantities)
+        out['restEnergy_GeV']=self.restEnergy_GeV
+        out['elementaryCharge']=self.elementaryCharge
+        return out
+
+    def revolutionFrequency_Hz(self, values, quantity, circumference_m):
+        """
+        Return the revolution frequency for a ring of circumference_m.
+        """
+        return self.convert(values, quantity, 'relativisticBeta')*(speedOfLight_m_s/circumference_m)
+
+    def lookupTable(self, fromQuantity, toQuantity, minimum, maximum, n=100001):
+        """
+        Return a function converting from fromQuantity to toQuantity by linear interpolation
+        on a table of n points between minimum and maximum (values outside are clipped).
+        """
+        grid=np.linspace(minimum, maximum, n)
+        table=self.convert(grid, fromQuantity, toQuantity)
+        def interpolate(values):
+            return np.interp(values, grid, table)
+        return interpolate
+
+proton=Species()
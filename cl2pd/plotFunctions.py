@@ -1,4 +1,7 @@
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
 import datetime 
 
 def setSourcePlot(gca, pltDescription,x=0.99,y=0.01,horizontalalignment='right',\
@@ -19,27 +22,103 @@ def setSourcePlot(gca, pltDescription,x=0.99,y=0.01,horizontalalignment='right',
              verticalalignment=verticalalignment, 
              transform=gca.transAxes,rotation=rotation, fontsize=fontsize);
   
-def setXDateTicks(ax, hours=1., myFormat='%H:%M', startDatetime=datetime.datetime.utcfromtimestamp(0)):
+class UTCDateLocator(mdates.DateLocator):
     """
-    setXDateTicks(ax=plt.gca(), hours=1., myFormat='%H:%M', startDatetime=datetime.datetime.utcfromtimestamp(0))
+    UTCDateLocator(hours=1., startDatetime=None, maxTicks=12, tz='UTC')
+    hours: specify the interval between the ticks
+    startDatetime: specify the time the ticks are aligned to (by default midnight in tz)
+    maxTicks: maximum number of ticks, when exceeded the interval is enlarged to a round multiple
+              (1, 2, 3, 6, 12 or 24 hours, then whole days)
+    tz: time zone of the axis (the importData outputs are UTC-localized)
+
+    The ticks are computed lazily for the current view at each draw, so pan and zoom on long time axes stay responsive.
+    By default the ticks are at the same wall-clock times of each day in tz (also across the daylight saving changes),
+    the ticks of several days are aligned to Monday 1970-01-05.
+    """
+    _niceHours=[1/60., 2/60., 5/60., 10/60., 15/60., 20/60., 0.5, 1., 2., 3., 4., 6., 8., 12.]
+    _niceDays=[1, 2, 3, 7, 14, 28]
+
+    def __init__(self, hours=1., startDatetime=None, maxTicks=12, tz='UTC'):
+        mdates.DateLocator.__init__(self, tz=tz)
+        self.hours=float(hours)
+        self.step=hours/24.
+        self.tzName=tz
+        if startDatetime is None:
+            self.origin=None
+        else:
+            self.origin=mdates.date2num(startDatetime)
+        self.maxTicks=maxTicks
+
+    def __call__(self):
+        vmin, vmax=self.axis.get_view_interval()
+        return self.tick_values(vmin, vmax)
+
+    def _isMultiple(self, hours):
+        return abs(hours/self.hours-round(hours/self.hours))<1e-9
+
+    def stepHours(self, vmin, vmax):
+        '''
+        Return the interval (hours) between the ticks for the view [vmin, vmax] (matplotlib date numbers).
+        '''
+        required=self.hours*max(1, int(np.ceil((vmax-vmin)/self.step/self.maxTicks)))
+        if required==self.hours:
+            return self.hours
+        for i in self._niceHours:
+            if i>=required-1e-9 and self._isMultiple(i):
+                return i
+        days=int(np.ceil(required/24.-1e-9))
+        for i in self._niceDays:
+            if i>=days and self._isMultiple(24.*i):
+                return 24.*i
+        # multiples of four weeks (or of the requested interval)
+        unit=24.*28 if self._isMultiple(24.*28) else self.hours
+        return unit*int(np.ceil(required/unit-1e-9))
+
+    def tick_values(self, vmin, vmax):
+        if vmax<vmin:
+            vmin, vmax=vmax, vmin
+        stepHours=self.stepHours(vmin, vmax)
+        step=stepHours/24.
+        if self.origin is not None:
+            first=self.origin+np.ceil((vmin-self.origin)/step)*step
+            return self.raise_if_exceeds(np.arange(first, vmax+step*1e-9, step))
+        # wall-clock times in tz
+        start=pd.Timestamp(mdates.num2date(vmin)).tz_convert(self.tzName).tz_localize(None)
+        end=pd.Timestamp(mdates.num2date(vmax)).tz_convert(self.tzName).tz_localize(None)
+        days=pd.date_range(start.floor('D'), end.floor('D'), freq='D')
+        if stepHours>=24:
+            n=int(round(stepHours/24.))
+            wall=days[((days-pd.Timestamp('1970-01-05')).days % n)==0]
+        else:
+            offsets=pd.to_timedelta(np.arange(0., 24., stepHours), unit='h')
+            wall=pd.DatetimeIndex((days.values[:, None]+offsets.values[None, :]).ravel())
+        wall=wall[(wall>=start) & (wall<=end)]
+        ticks=wall.tz_localize(self.tzName, ambiguous='NaT', nonexistent='NaT').dropna()
+        return self.raise_if_exceeds(mdates.date2num(ticks.tz_convert('UTC').to_pydatetime()))
+
+    def nonsingular(self, vmin, vmax):
+        if vmin==vmax:
+            return vmin-self.step, vmax+self.step
+        return vmin, vmax
+
+def setXDateTicks(ax, hours=1., myFormat='%H:%M', startDatetime=None, maxTicks=12, tz='UTC'):
+    """
+    setXDateTicks(ax=plt.gca(), hours=1., myFormat='%H:%M', startDatetime=None, maxTicks=12, tz='UTC')
     ax: specify the axis
     hours: specify the interval 
     myFormat: specify the format
-    startDatetime: specify the starting time (to have round captions)
-    """
-    aux=ax.get_xlim()
-    serial = aux[0]
-    if startDatetime ==datetime.datetime.utcfromtimestamp(0):
-        seconds = (serial - 719163.0) * 86400.0
-        startDatetime=datetime.datetime.utcfromtimestamp(seconds)
-    serial = aux[1]
-    seconds = (serial - 719163.0) * 86400.0
-    date_end=datetime.datetime.utcfromtimestamp(seconds)
-    t = np.arange(startDatetime, date_end, datetime.timedelta(hours=hours)).astype(datetime.datetime)
-    ax.set_xticks(t);
-    myFmt =mdates.DateFormatter(myFormat)
-    ax.xaxis.set_major_formatter(myFmt);
-    return startDatetime
+    startDatetime: specify the time the ticks are aligned to, by default midnight in tz (round captions)
+    maxTicks: specify the maximum number of ticks (the interval is enlarged to a round multiple if needed)
+    tz: specify the time zone of the captions (the importData outputs are UTC-localized)
+
+    It installs a UTCDateLocator and a DateFormatter on the x-axis and it returns the time the ticks are aligned to.
+    """
+    locator=UTCDateLocator(hours=hours, startDatetime=startDatetime, maxTicks=maxTicks, tz=tz)
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(myFormat, tz=tz))
+    if startDatetime is None:
+        return pd.Timestamp('1970-01-05').tz_localize(tz).to_pydatetime()
+    return mdates.num2date(locator.origin, tz=tz)
 
 def setArrowLabel(ax, label='myLabel',arrowPosition=(0,0),labelPosition=(0,0), myColor='k', arrowArc_rad=-0.2):
     return ax.annotate(label,
@@ -64,3 +143,112 @@ def setShadedRegion(ax,color='g' ,xLimit=[0,1],alpha=.1):
     plt.gca().fill_between(xLimit, 
                        [aux[0],aux[0]],  [aux[1],aux[1]],color=color, alpha=alpha)
     ax.set_ylim(aux)
+
+def _toDateNum(index):
+    """
+    Convert a (UTC-localized or naive UTC) pandas DatetimeIndex in matplotlib date numbers without python datetimes.
+    """
+    return index.values.astype('datetime64[ns]').astype(np.int64)/86400e9+mdates.date2num(datetime.datetime(1970, 1, 1))
+
+def _minMaxDecimation(x, y, nBins):
+    """
+    Return the points of (x, y) that are the minimum and the maximum of y in each of nBins bins of equal width in x.
+    x has to be sorted.
+    """
+    if len(x)<=4*nBins:
+        return x, y
+    starts=np.unique(np.searchsorted(x, np.linspace(x[0], x[-1], nBins+1)[:-1]))
+    counts=np.diff(np.append(starts, len(x)))
+    segment=np.repeat(np.arange(len(starts)), counts)
+    yMin=np.minimum.reduceat(y, starts)
+    yMax=np.maximum.reduceat(y, starts)
+    # first position of the minimum and of the maximum in each bin
+    iMin=np.flatnonzero(y==yMin[segment])
+    iMin=iMin[np.unique(segment[iMin], return_index=True)[1]]
+    iMax=np.flatnonzero(y==yMax[segment])
+    iMax=iMax[np.unique(segment[iMax], return_index=True)[1]]
+    index=np.sort(np.column_stack([iMin, iMax]), axis=1).ravel()
+    return x[index], y[index]
+
+def _lttbDecimation(x, y, nOut):
+    """
+    Return nOut points of (x, y) selected with the Largest-Triangle-Three-Buckets algorithm.
+    """
+    if len(x)<=nOut or nOut<3:
+        return x, y
+    edges=np.linspace(1, len(x)-1, nOut-1).astype(int)
+    index=np.zeros(nOut, dtype=int)
+    index[-1]=len(x)-1
+    a=0
+    for i in range(nOut-2):
+        start, end=edges[i], edges[i+1]
+        # average point of the next bucket
+        nextEnd=edges[i+2] if i+2<len(edges) else len(x)
+        xAverage=x[end:nextEnd].mean()
+        yAverage=y[end:nextEnd].mean()
+        area=np.abs((x[a]-xAverage)*(y[start:end]-y[a])-(x[a]-x[start:end])*(yAverage-y[a]))
+        a=start+np.argmax(area)
+        index[i+1]=a
+    return x[index], y[index]
+
+class _DecimatedLine:
+    """
+    A line showing a decimated version of (x, y), updated when the x-limits of the axis change.
+    """
+    def __init__(self, ax, x, y, method, pointsPerPixel, **kwargs):
+        self.x=x
+        self.y=y
+        self.method=method
+        self.pointsPerPixel=pointsPerPixel
+        self.line,=ax.plot(*self.decimate(ax, (x[0], x[-1])), **kwargs)
+        # the data limits are the ones of the full data
+        ax.update_datalim([[x[0], np.min(y)], [x[-1], np.max(y)]])
+
+    def decimate(self, ax, xLimit):
+        # one point more on each side, so that the line reaches the borders of the axis
+        first=max(np.searchsorted(self.x, xLimit[0])-1, 0)
+        last=min(np.searchsorted(self.x, xLimit[1])+1, len(self.x))
+        nBins=max(int(ax.get_window_extent().width*self.pointsPerPixel), 10)
+        if self.method=='minmax':
+            return _minMaxDecimation(self.x[first:last], self.y[first:last], nBins)
+        return _lttbDecimation(self.x[first:last], self.y[first:last], 2*nBins)
+
+    def update(self, ax):
+        self.line.set_data(*self.decimate(ax, ax.get_xlim()))
+
+def plotDecimated(ax, myData, method='minmax', pointsPerPixel=1., **kwargs):
+    """
+    plotDecimated(ax, myData, method='minmax', pointsPerPixel=1., **kwargs)
+    ax: plot axis to use
+    myData: pandas series or dataframe with a DatetimeIndex (e.g. from importData.cals2pd, UTC-localized)
+    method: 'minmax' (min/max envelope per bin) or 'lttb' (Largest-Triangle-Three-Buckets)
+    pointsPerPixel: number of bins per pixel of the axis width
+    kwargs: passed to ax.plot (e.g. label, color)
+
+    Each series is reduced to what fits the pixel width of the axis before drawing
+    and it is decimated again from the full data when the x-limits change (pan and zoom).
+    The NaN values are dropped. It returns the list of the plotted lines.
+
+    ===EXAMPLE===
+    raw_data = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2)
+    plotDecimated(plt.gca(), raw_data)
+    """
+    if method not in ['minmax', 'lttb']:
+        raise ValueError("method should be 'minmax' or 'lttb'.")
+    if myData.ndim==1:
+        myData=myData.to_frame()
+    lines=[]
+    for i in myData.columns:
+        aux=myData[i].dropna().sort_index()
+        if len(aux)==0:
+            continue
+        x=_toDateNum(aux.index)
+        y=np.asarray(aux.values, dtype=float)
+        myKwargs=dict(kwargs)
+        myKwargs.setdefault('label', i)
+        decimated=_DecimatedLine(ax, x, y, method, pointsPerPixel, **myKwargs)
+        ax.callbacks.connect('xlim_changed', lambda ax, decimated=decimated: decimated.update(ax))
+        lines.append(decimated.line)
+    ax.xaxis_date(tz='UTC')
+    ax.autoscale_view()
+    return lines
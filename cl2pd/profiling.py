@@ -0,0 +1,166 @@
+'''
+Lightweight instrumentation of the cl2pd importers.
+
+The importers report per-stage timers (e.g. 'cals.get', 'series', 'merge'), counters (e.g. 'samples', 'bytes')
+and per-window statistics of the split extractions to the active recorders.
+When no recorder is active the instrumentation reduces to a check of an empty list.
+
+===Example===
+from cl2pd import profiling
+with profiling.record() as stats:
+    raw_data = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2, split=10)
+stats.summary()    # time per stage and counters
+stats.windowsDF()  # one row per time window
+
+# To follow the extraction with the logging module or with a callback(kind, name, value)
+import logging
+with profiling.record(logger=logging.getLogger('cl2pd'), callback=lambda kind, name, value: print(kind, name, value)):
+    raw_data = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY'], t1, t2, split=10)
+'''
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# The active recorders (shared among threads, so that the workers of a parallel extraction are recorded too)
+_recorders=[]
+_recordersLock=threading.Lock()
+
+
+class Stats:
+    '''
+    Container of the timers, counters and windows reported by the importers.
+
+    timers: dictionary {stage: [number of calls, total time in seconds]}
+    counters: dictionary {name: total value}
+    windows: list of dictionaries, one per time window of a split extraction
+    '''
+
+    def __init__(self, callback=None, logger=None):
+        self.timers={}
+        self.counters={}
+        self.windows=[]
+        self.callback=callback
+        self.logger=logger
+        self._lock=threading.Lock()
+
+    def addTime(self, stage, seconds):
+        with self._lock:
+            aux=self.timers.setdefault(stage, [0, 0.])
+            aux[0]+=1
+            aux[1]+=seconds
+        self._notify('time', stage, seconds)
+
+    def addCount(self, name, value):
+        with self._lock:
+            self.counters[name]=self.counters.get(name, 0)+value
+        self._notify('count', name, value)
+
+    def addWindow(self, info):
+        with self._lock:
+            self.windows.append(info)
+        self._notify('window', info.get('function', ''), info)
+
+    def _notify(self, kind, name, value):
+        if self.callback is not None:
+            self.callback(kind, name, value)
+        if self.logger is not None:
+            self.logger.debug('%s %s %s', kind, name, value)
+
+    def summary(self):
+        '''
+        Return a pandas DataFrame with the timers (calls, seconds) and the counters (value).
+        '''
+        timers=pd.DataFrame([[i, self.timers[i][0], self.timers[i][1]] for i in sorted(self.timers)],
+                            columns=['stage', 'calls', 'seconds']).set_index('stage')
+        counters=pd.DataFrame([[i, self.counters[i]] for i in sorted(self.counters)],
+                              columns=['stage', 'value']).set_index('stage')
+        return pd.concat([timers, counters], axis=1)
+
+    def windowsDF(self):
+        '''
+        Return a pandas DataFrame with one row per time window.
+        '''
+        return pd.DataFrame(self.windows)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE=_NullStage()
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name=name
+
+    def __enter__(self):
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed=time.perf_counter()-self.start
+        for i in list(_recorders):
+            i.addTime(self.name, elapsed)
+        return False
+
+
+@contextmanager
+def record(callback=None, logger=None):
+    '''
+    Context manager activating a recorder and returning its Stats.
+
+    callback: optional function callback(kind, name, value) called at each event
+    ('time', 'count' or 'window').
+    logger: optional logging.Logger receiving each event at DEBUG level.
+    '''
+    stats=Stats(callback=callback, logger=logger)
+    with _recordersLock:
+        _recorders.append(stats)
+    try:
+        yield stats
+    finally:
+        with _recordersLock:
+            _recorders.remove(stats)
+
+
+def enabled():
+    '''
+    Return True if at least a recorder is active.
+    '''
+    return len(_recorders)>0
+
+
+def stage(name):
+    '''
+    Return a context manager timing the stage name (a no-op if no recorder is active).
+    '''
+    if not _recorders:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def count(name, value=1):
+    '''
+    Add value to the counter name.
+    '''
+    if not _recorders:
+        return
+    for i in list(_recorders):
+        i.addCount(name, value)
+
+
+def window(info):
+    '''
+    Report the statistics (a dictionary) of a time window.
+    '''
+    if not _recorders:
+        return
+    for i in list(_recorders):
+        i.addWindow(info)
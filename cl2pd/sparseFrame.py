@@ -0,0 +1,193 @@
+'''
+Sparse storage of the extracted variables.
+
+The outer join of a fast variable with many on-change variables (settings, motors, ...) is a dense
+time x variable frame that is almost all NaN. A SparseFrame keeps each variable as its own run
+(sorted int64 ns times, values) and the wide view (outer join) or the forward-filled view
+at chosen timestamps is materialized only when requested.
+
+===Example===
+myData = importData.cals2pd(['LHC.BCTDC.A6R4.B%:BEAM_INTENSITY','RPMBB.RR17.ROD.A12B1:I_MEAS'], t1, t2, sparse=True)
+myData['LHC.BCTDC.A6R4.B1:BEAM_INTENSITY']                 # pd Series of the variable samples
+myData.between(t1, t1+pd.Timedelta('1h'))                  # SparseFrame
+myData.asof(pd.date_range(t1, t2, freq='10s'))             # forward-filled pd DataFrame
+myData.toDataFrame()                                       # same wide view as cals2pd(..., sparse=False)
+'''
+import numpy as np
+import pandas as pd
+
+
+def _toNs(t):
+    '''
+    Return the int64 ns (UTC) of t (tz-naive expressions are considered UTC-localized).
+    '''
+    t=pd.Timestamp(t)
+    if t.tz is None:
+        t=t.tz_localize('UTC')
+    return t.value
+
+
+def _index(times):
+    return pd.DatetimeIndex(np.asarray(times).astype('datetime64[ns]')).tz_localize('UTC')
+
+
+def _rows(values):
+    '''
+    Return values as a 1-D array (the rows of a 2-D array of vector samples become the elements).
+    '''
+    if values.ndim==1:
+        return values
+    aux=np.empty(len(values), dtype=object)
+    aux[:]=list(values)
+    return aux
+
+
+def _concatValues(valuesList):
+    '''
+    Return the concatenation of the values arrays of a variable.
+
+    If the shapes of the samples differ (e.g. a vector variable changing length, or 2-D and object arrays)
+    the samples are concatenated as 1-D object arrays.
+    '''
+    if len(set([i.shape[1:] for i in valuesList]))==1:
+        try:
+            return np.concatenate(valuesList)
+        except ValueError:
+            pass
+    return np.concatenate([_rows(i).astype(object) for i in valuesList])
+
+
+class SparseFrame:
+    '''
+    Container of per-variable runs {variable: (times, values)}.
+
+    times: sorted int64 array of ns since epoch (UTC)
+    values: array with the same length of times (2-D for vector variables)
+    '''
+
+    def __init__(self, runs=None):
+        self.runs={} if runs is None else dict(runs)
+
+    @classmethod
+    def fromCals(cls, DATA):
+        '''
+        Return a SparseFrame from the dictionary {variable: (unix timestamps, values)} of cals.get.
+        '''
+        runs={}
+        for i in DATA:
+            times=pd.to_datetime(np.asarray(DATA[i][0]), unit='s').values.astype('datetime64[ns]').astype(np.int64)
+            values=np.asarray(DATA[i][1])
+            order=np.argsort(times, kind='mergesort')
+            runs[i]=(times[order], values[order])
+        return cls(runs)
+
+    @classmethod
+    def concat(cls, myList):
+        '''
+        Return the SparseFrame joining the SparseFrames of myList (e.g. consecutive time windows).
+
+        At the same timestamp the sample of the first SparseFrame is kept.
+        '''
+        runs={}
+        names=sorted(set([j for i in myList for j in i.runs]))
+        for name in names:
+            aux=[i.runs[name] for i in myList if name in i.runs]
+            times=np.concatenate([i[0] for i in aux])
+            values=_concatValues([i[1] for i in aux])
+            order=np.argsort(times, kind='mergesort')
+            times, values=times[order], values[order]
+            keep=np.append(True, times[1:]!=times[:-1]) if len(times) else np.array([], dtype=bool)
+            runs[name]=(times[keep], values[keep])
+        return cls(runs)
+
+    @property
+    def columns(self):
+        return sorted(self.runs)
+
+    @property
+    def nbytes(self):
+        '''
+        Memory (bytes) of the times and values arrays.
+        '''
+        return sum([i[0].nbytes+i[1].nbytes for i in self.runs.values()])
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, name):
+        return name in self.runs
+
+    def __repr__(self):
+        return ('SparseFrame(' + str(len(self.runs)) + ' variables, '
+                + str(sum([len(i[0]) for i in self.runs.values()])) + ' samples)')
+
+    def __getitem__(self, key):
+        '''
+        Return the samples of a variable (pd Series) or the SparseFrame of a list of variables.
+        '''
+        if isinstance(key, str):
+            times, values=self.runs[key]
+            return pd.Series(_rows(values), index=_index(times), name=key)
+        return SparseFrame({i: self.runs[i] for i in key})
+
+    def between(self, t1, t2):
+        '''
+        Return the SparseFrame of the samples within [t1, t2].
+        '''
+        t1, t2=_toNs(t1), _toNs(t2)
+        runs={}
+        for i in self.runs:
+            times, values=self.runs[i]
+            start, end=np.searchsorted(times, t1, side='left'), np.searchsorted(times, t2, side='right')
+            runs[i]=(times[start:end], values[start:end])
+        return SparseFrame(runs)
+
+    def asof(self, when, columns=None):
+        '''
+        Return the last value of each variable at the timestamps when (forward-filled view).
+
+        If when is a single timestamp a pd Series indexed by variable is returned,
+        otherwise a pd DataFrame indexed by when. The values before the first sample are NaN.
+        '''
+        single=not isinstance(when, (pd.DatetimeIndex, list, np.ndarray, pd.Series))
+        index=pd.DatetimeIndex([when] if single else when)
+        if index.tz is None:
+            index=index.tz_localize('UTC')
+        stamps=index.values.astype('datetime64[ns]').astype(np.int64)
+        columns=self.columns if columns is None else columns
+        data={}
+        for i in columns:
+            times, values=self.runs[i]
+            position=np.searchsorted(times, stamps, side='right')-1
+            valid=position>=0
+            values=_rows(values)
+            if values.dtype.kind in 'fiub':
+                aux=np.full(len(stamps), np.nan)
+            else:
+                aux=np.full(len(stamps), np.nan, dtype=object)
+            aux[valid]=values[position[valid]]
+            data[i]=aux
+        myDF=pd.DataFrame(data, index=index, columns=columns)
+        if single:
+            return myDF.iloc[0]
+        return myDF
+
+    def toDataFrame(self, columns=None):
+        '''
+        Return the wide view (outer join on all the timestamps, UTC-localized) as a pd DataFrame.
+        '''
+        columns=self.columns if columns is None else columns
+        if len(columns)==0:
+            return pd.DataFrame()
+        times=np.unique(np.concatenate([self.runs[i][0] for i in columns]))
+        data={}
+        for i in columns:
+            runTimes, values=self.runs[i]
+            values=_rows(values)
+            if values.dtype.kind in 'fiub':
+                aux=np.full(len(times), np.nan)
+            else:
+                aux=np.full(len(times), np.nan, dtype=object)
+            aux[np.searchsorted(times, runTimes)]=values
+            data[i]=aux
+        return pd.DataFrame(data, index=_index(times), columns=columns)
@@ -0,0 +1,17 @@
+'''
+Test configuration: cl2pd.importData connects to CALS at import, the tests replace pytimber
+with an offline module (the backend used by each test is assigned to importData.cals).
+'''
+import sys
+import types
+
+
+class _OfflineLoggingDB:
+    def __getattr__(self, name):
+        raise RuntimeError('No CALS backend in the tests: assign importData.cals.')
+
+
+if 'pytimber' not in sys.modules:
+    _pytimber=types.ModuleType('pytimber')
+    _pytimber.LoggingDB=_OfflineLoggingDB
+    sys.modules['pytimber']=_pytimber
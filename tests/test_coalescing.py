@@ -0,0 +1,161 @@
+'''
+Concurrency tests of cl2pd.coalescing: the calls actually sent to the backend are checked.
+
+The backend is a fake LoggingDB, no connection to CALS is needed.
+'''
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cl2pd import coalescing
+
+T0=pd.Timestamp('2018-01-01', tz='UTC')
+HOUR=3600.
+
+
+class FakeDB:
+    '''
+    Fake LoggingDB with one sample per minute per variable, recording the calls.
+    '''
+
+    def __init__(self, latency=0.2):
+        self.latency=latency
+        self.calls=[]
+        self.lock=threading.Lock()
+
+    def get(self, variables, t1, t2, fundamental=None):
+        t1, t2=pd.Timestamp(t1).value/1e9, pd.Timestamp(t2).value/1e9
+        with self.lock:
+            self.calls.append((tuple(sorted(variables)), t1, t2))
+        time.sleep(self.latency)
+        timestamps=np.arange(np.ceil(t1/60.)*60., t2+1., 60.)
+        timestamps=timestamps[timestamps<=t2]
+        return dict((i, (timestamps, np.full(len(timestamps), float(len(i))))) for i in variables)
+
+    def search(self, pattern):
+        return [pattern.replace('%', str(i)) for i in (1, 2)]
+
+    def getLHCFillData(self, fillNumber):
+        with self.lock:
+            self.calls.append(('fill', fillNumber))
+        time.sleep(self.latency)
+        return {'fillNumber': fillNumber}
+
+
+def _concurrent(db, requests, stagger=0.02):
+    '''
+    Run the requests [(variables, t1 offset (s), t2 offset (s))] in concurrent threads
+    and return their results in order.
+    '''
+    results=[None]*len(requests)
+
+    def worker(i, variables, start, end):
+        results[i]=db.get(variables, T0+pd.Timedelta(seconds=start), T0+pd.Timedelta(seconds=end))
+
+    threads=[threading.Thread(target=worker, args=(i,)+tuple(j)) for i, j in enumerate(requests)]
+    for i in threads:
+        i.start()
+        time.sleep(stagger)
+    for i in threads:
+        i.join()
+    return results
+
+
+def _relative(call):
+    return call[0], call[1]-T0.value/1e9, call[2]-T0.value/1e9
+
+
+def test_different_variables_on_different_intervals_are_not_merged():
+    backend=FakeDB()
+    db=coalescing.CoalescingDB(backend, delay=0.2)
+    results=_concurrent(db, [(['A'], 0, HOUR), (['B'], 0, 30*24*HOUR)])
+    assert sorted([_relative(i) for i in backend.calls])==[(('A',), 0, HOUR), (('B',), 0, 30*24*HOUR)]
+    assert list(results[0])==['A'] and len(results[0]['A'][0])==61
+    assert list(results[1])==['B']
+
+
+def test_same_variables_on_overlapping_intervals_are_merged():
+    backend=FakeDB()
+    db=coalescing.CoalescingDB(backend, delay=0.2)
+    results=_concurrent(db, [(['A'], 0, HOUR), (['A'], HOUR/2, 2*HOUR)])
+    assert [_relative(i) for i in backend.calls]==[(('A',), 0, 2*HOUR)]
+    assert len(results[0]['A'][0])==61
+    assert len(results[1]['A'][0])==91
+    assert results[1]['A'][0][0]==T0.value/1e9+HOUR/2
+
+
+def test_different_variables_on_the_same_interval_are_merged():
+    backend=FakeDB()
+    db=coalescing.CoalescingDB(backend, delay=0.2)
+    results=_concurrent(db, [(['A'], 0, HOUR), (['B'], 0, HOUR)])
+    assert [_relative(i) for i in backend.calls]==[(('A', 'B'), 0, HOUR)]
+    assert list(results[0])==['A'] and list(results[1])==['B']
+
+
+def test_running_request_is_joined_only_if_it_covers():
+    backend=FakeDB(latency=0.5)
+    db=coalescing.CoalescingDB(backend)
+    # the first request is already running when the others arrive
+    _concurrent(db, [(['A', 'B'], 0, 2*HOUR), (['A'], HOUR/2, HOUR), (['A'], HOUR, 3*HOUR)], stagger=0.1)
+    assert sorted([_relative(i) for i in backend.calls])==[(('A',), HOUR, 3*HOUR), (('A', 'B'), 0, 2*HOUR)]
+
+
+def test_concurrency_is_capped():
+    backend=FakeDB(latency=0.2)
+    db=coalescing.CoalescingDB(backend, maxConcurrent=2)
+    active=[0, 0]
+    get=backend.get
+
+    def countingGet(*args):
+        with backend.lock:
+            active[0]+=1
+            active[1]=max(active[1], active[0])
+        try:
+            return get(*args)
+        finally:
+            with backend.lock:
+                active[0]-=1
+
+    backend.get=countingGet
+    _concurrent(db, [(['V' + str(i)], 10*i*HOUR, (10*i+1)*HOUR) for i in range(6)], stagger=0)
+    assert len(backend.calls)==6
+    assert active[1]==2
+
+
+def test_identical_fill_requests_are_merged():
+    backend=FakeDB()
+    db=coalescing.CoalescingDB(backend)
+    threads=[threading.Thread(target=db.getLHCFillData, args=(6400,)) for i in range(3)]
+    for i in threads:
+        i.start()
+    for i in threads:
+        i.join()
+    assert backend.calls==[('fill', 6400)]
+
+
+def test_patterns_are_resolved_before_merging():
+    backend=FakeDB(latency=0)
+    db=coalescing.CoalescingDB(backend)
+    DATA=db.get('B%:VALUE', T0, T0+pd.Timedelta(seconds=HOUR))
+    assert sorted(DATA)==['B1:VALUE', 'B2:VALUE']
+    assert [_relative(i) for i in backend.calls]==[(('B1:VALUE', 'B2:VALUE'), 0, HOUR)]
+    assert len(DATA['B1:VALUE'][0])==61
+
+
+def test_naive_times_are_local_and_unixtime_is_accepted(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Zurich')
+    time.tzset()
+    try:
+        backend=FakeDB(latency=0)
+        db=coalescing.CoalescingDB(backend)
+        # as in pytimber, the tz-naive times are in the local time (CET)
+        DATA=db.get(['A'], '2018-01-01 01:00', pd.Timestamp('2018-01-01 02:00'), unixtime=False)
+        assert [_relative(i) for i in backend.calls]==[(('A',), 0, HOUR)]
+        assert DATA['A'][0][0]==datetime.datetime(2018, 1, 1, 1, 0)
+        assert len(DATA['A'][0])==61
+    finally:
+        monkeypatch.undo()
+        time.tzset()
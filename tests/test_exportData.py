@@ -0,0 +1,42 @@
+'''
+Tests of cl2pd.exportData on small synthetic outputs.
+'''
+import numpy as np
+import pandas as pd
+
+from cl2pd import exportData
+
+T0=pd.Timestamp('2018-01-01', tz='UTC')
+
+
+def _massi(times, luminosity):
+    '''
+    Return a massiFile2pd-like dataframe (two bunches per timestamp).
+    '''
+    index=pd.DatetimeIndex([T0+pd.Timedelta(seconds=i) for i in times for j in (1, 2)])
+    return pd.DataFrame({'FILL': 6400, 'Stable Beam Flag': 1, 'Experiment': 'ATLAS',
+                         'Bunch': [j for i in times for j in (1, 2)],
+                         'Luminosity [Hz/ub]': luminosity*np.ones(len(index))}, index=index)
+
+
+def test_exporting_a_table_twice_does_not_duplicate_the_rows(tmp_path):
+    myDF=_massi([0, 60], 1.)
+    exportData.pd2parquet(myDF, str(tmp_path))
+    exportData.pd2parquet(myDF, str(tmp_path))
+    stored=exportData.ParquetStore(str(tmp_path)).queryTable()
+    assert len(stored)==4
+
+    # the overlapping rows are replaced, the new ones are added
+    exportData.pd2parquet(_massi([60, 120], 2.), str(tmp_path))
+    stored=exportData.ParquetStore(str(tmp_path)).queryTable()
+    assert len(stored)==6
+    assert stored['Luminosity [Hz/ub]'].tolist()==[1., 1., 2., 2., 2., 2.]
+    assert stored['Bunch'].tolist()==[1, 2, 1, 2, 1, 2]
+
+
+def test_exporting_a_variable_twice_does_not_duplicate_the_samples(tmp_path):
+    myDF=pd.DataFrame({'A:VALUE': [1., 2., 3.]}, index=T0+pd.to_timedelta([0, 1, 2], unit='s'))
+    exportData.pd2parquet(myDF, str(tmp_path))
+    exportData.pd2parquet(myDF*2, str(tmp_path))
+    stored=exportData.ParquetStore(str(tmp_path)).query(['A:VALUE'])
+    assert stored['A:VALUE'].tolist()==[2., 4., 6.]
@@ -0,0 +1,223 @@
+'''
+Tests of cl2pd.importData with fake CALS backends.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from cl2pd import importData
+
+T0=pd.Timestamp('2018-01-01', tz='UTC')
+
+
+def _unix(t):
+    return pd.Timestamp(t).value/1e9
+
+
+class FakeCals:
+    '''
+    Fake LoggingDB with fixed samples {variable: (unix timestamps, values)}, recording the get calls.
+    '''
+
+    def __init__(self, data):
+        self.data=data
+        self.calls=[]
+
+    def search(self, pattern):
+        import fnmatch
+        return sorted([i for i in self.data if fnmatch.fnmatch(i, pattern.replace('%', '*'))])
+
+    def get(self, variables, t1, t2, fundamental=None):
+        t1, t2=_unix(t1), _unix(t2)
+        self.calls.append((tuple(variables), t1, t2))
+        out={}
+        for i in variables:
+            timestamps, values=self.data[i]
+            mask=(timestamps>=t1) & (timestamps<=t2)
+            out[i]=(timestamps[mask], values[mask])
+        return out
+
+
+@pytest.fixture
+def cals(monkeypatch):
+    times=_unix(T0)+np.arange(0., 4*3600.)
+    fake=FakeCals({'FAST:VALUE': (times, np.arange(len(times))*1.),
+                   # on-change variable, last change near the start
+                   'SLOW:VALUE': (times[:2], np.array([1., 2.])),
+                   'NEVER:VALUE': (np.array([]), np.array([]))})
+    monkeypatch.setattr(importData, 'cals', fake)
+    return fake
+
+
+def test_poller_fetches_only_the_new_interval(cals):
+    poller=importData.CalsPoller(['FAST:VALUE', 'SLOW:VALUE', 'NEVER:VALUE'], retention=pd.Timedelta('1h'))
+    first=poller.poll(T0+pd.Timedelta('1h'))
+    assert len(first)==3601
+    newData=poller.poll(T0+pd.Timedelta('1h')+pd.Timedelta('60s'))
+    # only the last poll interval (plus the overlap) is fetched
+    assert cals.calls[-1][2]-cals.calls[-1][1]==70.
+    assert list(newData.columns)==['FAST:VALUE']
+    assert len(newData)==60
+
+
+def test_poller_buffers_are_trimmed_and_sorted(cals):
+    poller=importData.CalsPoller(['SLOW:VALUE', 'FAST:VALUE'], retention=pd.Timedelta('10min'), maxSamples=300)
+    for i in range(1, 6):
+        poller.poll(T0+pd.Timedelta(minutes=10*i))
+    assert list(poller.data.columns)==['FAST:VALUE']
+    assert len(poller.data)==300
+    assert poller.data.index[-1]==T0+pd.Timedelta(minutes=50)
+    assert poller.data['FAST:VALUE'].iloc[-1]==50*60.
+
+    poller=importData.CalsPoller(['SLOW:VALUE', 'FAST:VALUE'], retention=pd.Timedelta('10min'))
+    poller.poll(T0+pd.Timedelta('30s'))
+    assert list(poller.data.columns)==['FAST:VALUE', 'SLOW:VALUE']
+    poller.poll(T0+pd.Timedelta('90s'))
+    expected=importData.cals2pd(['FAST:VALUE', 'SLOW:VALUE'], T0, T0+pd.Timedelta('90s'))
+    pd.testing.assert_frame_equal(poller.data, expected, check_index_type=False, check_freq=False)
+
+
+class FakeFills(FakeCals):
+    '''
+    FakeCals with one fill per hour (STABLE in the second half).
+    '''
+
+    def getLHCFillData(self, fillNumber):
+        start=_unix(T0)+fillNumber*3600.
+        return {'fillNumber': fillNumber, 'startTime': start, 'endTime': start+3600.,
+                'beamModes': [{'mode': 'INJPROT', 'startTime': start, 'endTime': start+1800.},
+                              {'mode': 'STABLE', 'startTime': start+1800., 'endTime': start+3600.}]}
+
+
+def test_LHCFills2pd_cache_depends_on_the_variables(monkeypatch, tmp_path):
+    times=_unix(T0)+np.arange(0., 4*3600., 60.)
+    fake=FakeFills({'A:VALUE': (times, np.ones(len(times))), 'B:VALUE': (times, 2*np.ones(len(times)))})
+    monkeypatch.setattr(importData, 'cals', fake)
+    both=importData.LHCFills2pd(['A:VALUE', 'B:VALUE'], [1, 2], cacheDir=str(tmp_path), maxWorkers=1)
+    assert list(both.columns)==['A:VALUE', 'B:VALUE']
+    calls=len(fake.calls)
+
+    # the same extraction is read from the cache
+    again=importData.LHCFills2pd(['B:VALUE', 'A:VALUE'], [1, 2], cacheDir=str(tmp_path), maxWorkers=1)
+    assert len(fake.calls)==calls
+    pd.testing.assert_frame_equal(again, both)
+
+    # a different extraction is fetched
+    onlyA=importData.LHCFills2pd(['A:VALUE'], [1, 2], cacheDir=str(tmp_path), maxWorkers=1)
+    assert len(fake.calls)>calls
+    assert list(onlyA.columns)==['A:VALUE']
+
+
+@pytest.mark.parametrize('agg', ['1h', '1D', 'W', 'MS', 'ME'])
+def test_cals2pd_agg_windows_do_not_split_bins(monkeypatch, agg):
+    times=_unix(T0)+np.arange(0., 70*86400., 600.)
+    fake=FakeCals({'A:VALUE': (times, np.random.rand(len(times)))})
+    monkeypatch.setattr(importData, 'cals', fake)
+    t1, t2=T0+pd.Timedelta('5h'), T0+pd.Timedelta(days=65)
+    myDF=importData.cals2pd(['A:VALUE'], t1, t2, agg=agg, funcs=['mean', 'count'])
+    # the raw data are fetched in about one-day windows
+    assert len(fake.calls)>1 and max([i[2]-i[1] for i in fake.calls])<=40*86400.
+    raw=importData.cals2pd(['A:VALUE'], t1, t2)
+    expected=importData._aggregate(raw, agg, ['mean', 'count'])
+    assert myDF.index.is_unique
+    pd.testing.assert_frame_equal(myDF, expected.sort_index(axis=1), check_freq=False)
+
+
+def test_cals2pd_agg_not_a_frequency(cals):
+    with pytest.raises(ValueError, match='agg should be a pandas frequency'):
+        importData.cals2pd(['FAST:VALUE'], T0, T0+pd.Timedelta('1h'), agg='often')
+
+
+@pytest.mark.parametrize('rechunk', ['combine', 'slices'])
+def test_arrow2pd_does_not_depend_on_the_batches(monkeypatch, rechunk):
+    times=_unix(T0)+np.arange(0., 3600., 60.)
+    fake=FakeCals({'A:VALUE': (times, np.arange(len(times))*1.),
+                   'B:VALUE': (times[::2], -np.arange(len(times[::2]))*1.),
+                   'V:VALUE': (times, np.arange(3*len(times)).reshape(len(times), 3)*1.),
+                   'S:VALUE': (times[:5], np.array(['a', 'b', 'c', 'd', 'e']))})
+    monkeypatch.setattr(importData, 'cals', fake)
+    t1, t2=T0, T0+pd.Timedelta('1h')
+    table=importData.cals2arrow(sorted(fake.data), t1, t2, split=2)
+    expected=importData.arrow2pd(table)
+    assert list(expected.columns)==['A:VALUE', 'B:VALUE', 'S:VALUE', 'V:VALUE']
+    if rechunk=='combine':
+        table=table.combine_chunks()
+        assert table.column('variable').num_chunks==1
+    else:
+        import pyarrow as pa
+        table=pa.Table.from_batches(table.combine_chunks().to_batches(max_chunksize=7))
+    myDF=importData.arrow2pd(table)
+    pd.testing.assert_frame_equal(myDF, expected)
+    assert myDF['A:VALUE'].dropna().tolist()==list(np.arange(len(times))*1.)
+    np.testing.assert_array_equal(myDF['V:VALUE'].iloc[1], [3., 4., 5.])
+    assert myDF['S:VALUE'].dropna().tolist()==['a', 'b', 'c', 'd', 'e']
+
+
+class FakeFillsByTime:
+    '''
+    Fake LoggingDB with the fills {fillNumber: (start, end)} (unix s, end None for the online fill).
+    '''
+
+    def __init__(self, fills):
+        self.fills=dict(fills)
+        self.calls=[]
+
+    def getLHCFillsByTime(self, t1, t2):
+        t1, t2=_unix(t1), _unix(t2)
+        self.calls.append((t1, t2))
+        out=[]
+        for i, (start, end) in sorted(self.fills.items()):
+            if start<=t2 and (end is None or end>=t1):
+                out.append({'fillNumber': i, 'startTime': start, 'endTime': end,
+                            'beamModes': [{'mode': 'STABLE', 'startTime': start, 'endTime': end}]})
+        return out
+
+
+@pytest.fixture
+def fills(monkeypatch):
+    start=_unix(T0)
+    fake=FakeFillsByTime({i: (start+i*3600., start+(i+1)*3600.-60.) for i in range(1, 48)})
+    monkeypatch.setattr(importData, 'cals', fake)
+    importData.clearLHCFillsCache()
+    yield fake
+    importData.clearLHCFillsCache()
+
+
+def test_LHCFillsByTime_cache(fills):
+    t1, t2=T0+pd.Timedelta('10h'), T0+pd.Timedelta('30h')
+    expected=importData.LHCFillsByTime(t1, t2, cache=False)
+    calls=len(fills.calls)
+    first=importData.LHCFillsByTime(t1, t2)
+    assert len(fills.calls)>calls
+    calls=len(fills.calls)
+    # the second call is served by the cache
+    cached=importData.LHCFillsByTime(t1, t2)
+    assert len(fills.calls)==calls
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(cached.sort_index(kind='mergesort'), expected.sort_index(kind='mergesort'))
+    # only the span not yet covered is fetched
+    importData.LHCFillsByTime(t1, t2+pd.Timedelta('5h'))
+    assert fills.calls[-1]==(_unix(t2), _unix(t2+pd.Timedelta('5h')))
+
+    # cleared explicitly or when the backend is replaced
+    importData.clearLHCFillsCache()
+    importData.LHCFillsByTime(t1, t2)
+    assert len(fills.calls)==calls+2
+    other=FakeFillsByTime({})
+    importData.cals=other
+    assert len(importData.LHCFillsByTime(t1, t2))==0
+    assert len(other.calls)==1
+
+
+def test_LHCFillsByTime_online_fill_is_refreshed(fills):
+    start=_unix(T0)+48*3600.
+    fills.fills[48]=(start, None)
+    t1, t2=T0+pd.Timedelta('40h'), T0+pd.Timedelta('60h')
+    first=importData.LHCFillsByTime(t1, t2)
+    assert first.loc[48, 'endTime'].isna().all()
+    # the fill is dumped: the span from its start is fetched again
+    fills.fills[48]=(start, start+7200.)
+    second=importData.LHCFillsByTime(t1, t2)
+    assert fills.calls[-1]==(start, _unix(t2))
+    assert (second.loc[48, 'endTime']==pd.Timestamp(start+7200., unit='s', tz='UTC')).all()
+    pd.testing.assert_frame_equal(second, importData.LHCFillsByTime(t1, t2, cache=False))
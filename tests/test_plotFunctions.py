@@ -0,0 +1,44 @@
+'''
+Tests of the tick locator of cl2pd.plotFunctions.
+'''
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+import pandas as pd
+
+from cl2pd import plotFunctions
+
+
+def _ticks(locator, t1, t2):
+    ticks=locator.tick_values(mdates.date2num(t1.to_pydatetime()), mdates.date2num(t2.to_pydatetime()))
+    return pd.DatetimeIndex([pd.Timestamp(i) for i in mdates.num2date(ticks)]).tz_convert(locator.tzName)
+
+
+def test_ticks_are_aligned_to_midnight_in_tz():
+    locator=plotFunctions.UTCDateLocator(hours=24, tz='CET')
+    ticks=_ticks(locator, pd.Timestamp('2018-03-20', tz='UTC'), pd.Timestamp('2018-03-30', tz='UTC'))
+    # also across the daylight saving change of 2018-03-25
+    assert len(ticks)==10
+    assert (ticks.hour==0).all() and (ticks.minute==0).all()
+
+    locator=plotFunctions.UTCDateLocator(hours=6, tz='CET')
+    ticks=_ticks(locator, pd.Timestamp('2018-07-01 05:00', tz='UTC'), pd.Timestamp('2018-07-02', tz='UTC'))
+    assert list(ticks.hour)==[12, 18, 0]
+
+
+def test_capped_interval_is_a_round_multiple():
+    locator=plotFunctions.UTCDateLocator(hours=1, maxTicks=12)
+    t1=pd.Timestamp('2018-01-01', tz='UTC')
+    ticks=_ticks(locator, t1, t1+pd.Timedelta(days=25))
+    steps=set(ticks[1:]-ticks[:-1])
+    assert steps=={pd.Timedelta(days=3)}
+    assert len(ticks)<=12 and (ticks.hour==0).all()
+
+    ticks=_ticks(locator, t1, t1+pd.Timedelta(hours=30))
+    assert set(ticks[1:]-ticks[:-1])=={pd.Timedelta(hours=3)}
+
+
+def test_start_datetime_is_kept():
+    locator=plotFunctions.UTCDateLocator(hours=2, startDatetime=pd.Timestamp('2018-01-01 00:30', tz='UTC'))
+    ticks=_ticks(locator, pd.Timestamp('2018-01-01', tz='UTC'), pd.Timestamp('2018-01-01 06:00', tz='UTC'))
+    assert list(ticks.strftime('%H:%M'))==['00:30', '02:30', '04:30']
@@ -0,0 +1,37 @@
+'''
+Tests of cl2pd.sparseFrame.
+'''
+import numpy as np
+import pandas as pd
+
+from cl2pd.sparseFrame import SparseFrame
+
+T0=pd.Timestamp('2018-01-01', tz='UTC').value/1e9
+
+
+def test_concat_vector_variable_changing_length():
+    first=SparseFrame.fromCals({'V': (T0+np.arange(3.), np.ones((3, 5)))})
+    second=SparseFrame.fromCals({'V': (T0+3+np.arange(2.), np.ones((2, 6)))})
+    myData=SparseFrame.concat([first, second])
+    series=myData['V']
+    assert len(series)==5
+    assert [len(i) for i in series]==[5, 5, 5, 6, 6]
+
+
+def test_concat_2d_and_object_arrays():
+    aux=np.empty(2, dtype=object)
+    aux[:]=[np.ones(4), np.ones(4)]
+    first=SparseFrame.fromCals({'V': (T0+np.arange(3.), np.zeros((3, 4)))})
+    second=SparseFrame.fromCals({'V': (T0+3+np.arange(2.), aux)})
+    myDF=SparseFrame.concat([first, second]).toDataFrame()
+    assert len(myDF)==5
+    assert np.array_equal(myDF['V'].iloc[0], np.zeros(4))
+    assert np.array_equal(myDF['V'].iloc[-1], np.ones(4))
+
+
+def test_concat_keeps_first_sample_at_same_timestamp():
+    first=SparseFrame.fromCals({'A': (T0+np.arange(3.), np.arange(3.))})
+    second=SparseFrame.fromCals({'A': (T0+2+np.arange(3.), 10+np.arange(3.))})
+    series=SparseFrame.concat([first, second])['A']
+    assert series.tolist()==[0., 1., 2., 11., 12.]
+    assert series.dtype==float